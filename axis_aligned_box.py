@@ -1,7 +1,13 @@
 from __future__ import annotations
 import dataclasses
+import numpy as np
 from custom_types import R2, R2Pair
-from intersection import pathSegCollision
+from intersection import SegmentIndex, pathSegCollision, pathSegCollisionPairs
+from numpy.typing import ArrayLike
+from typing import TYPE_CHECKING, ClassVar
+
+if TYPE_CHECKING:
+    from grid_collision import GridCollider
 
 
 # bad code; do not use as basis for physics engine
@@ -67,25 +73,84 @@ class AxisAlignedPlatform:
         return ((rx - hw, ry), (rx + hw, ry))
 
 
+@dataclasses.dataclass
+class AAStepStats:
+    boxes: int
+    broadPhasePairs: int   # (box, platform) candidates from the broad phase
+    narrowPhasePairs: int  # candidates whose paths actually hit the platform
+    gridCellsTested: int = 0  # cells looked at by `AASystem.grid`
+
+
 @dataclasses.dataclass
 class AASystem:
     boxes: list[AxisAlignedBox]
     platforms: list[AxisAlignedPlatform]
     gravAccel: R2
+    broadPhaseCellSize: float = 4.0
+    collectStats: bool = False  # if set, `step` fills in `stats`
+    grid: GridCollider | None = None  # solid blocks to collide with, if any
+    stats: AAStepStats | None = dataclasses.field(default=None, init=False)
+
+    # broad phase: platform segments in a uniform grid, keyed by list index
+    _index: SegmentIndex = dataclasses.field(
+        init=False, repr=False, compare=False)
+    _indexed: list[R2Pair] = dataclasses.field(
+        init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._index = SegmentIndex(self.broadPhaseCellSize)
+        self._indexed = []
+
+    def _syncBroadPhase(self) -> list[R2Pair]:
+        # brings the index up to date with `self.platforms`, re-inserting only
+        # the platforms that were added, moved or removed since last step
+        index, indexed = self._index, self._indexed
+        segs = [pl.segment() for pl in self.platforms]
+        for i, seg in enumerate(segs):
+            if i == len(indexed):
+                index.insert(seg, key=i)
+                indexed.append(seg)
+            elif seg != indexed[i]:
+                index.remove(i)
+                index.insert(seg, key=i)
+                indexed[i] = seg
+        for i in range(len(segs), len(indexed)):
+            index.remove(i)
+        del indexed[len(segs):]
+        return segs
 
     def step(self, deltaTime: float) -> None:
         gx, gy = self.gravAccel
+        segs = self._syncBroadPhase()
+        broad = narrow = 0
+        cells0 = 0 if self.grid is None else self.grid.cellsTested
 
         for i, b in enumerate(self.boxes):
             b_ = b.stepped((b.mass*gx, b.mass*gy), deltaTime)
-            *paths, = zip(b.vertices(), b_.vertices())
+            vs, vs_ = b.vertices(), b_.vertices()
+            *paths, = zip(vs, vs_)
 
-            x = (
-                min(xs)
-            if (xs:=[x for p in paths for pl in self.platforms
-                    if (x:=pathSegCollision(p, pl.segment())) is not None]) else
-                None
-            )
+            # swept AABB: vertices 0 and 3 are the min and max corners
+            (x0, y0), (x1, y1) = vs[0], vs[3]
+            (x0_, y0_), (x1_, y1_) = vs_[0], vs_[3]
+            candidates = self._index.query_rect(
+                (min(x0, x0_), min(y0, y0_)), (max(x1, x1_), max(y1, y1_)))
+
+            x: float | None = None
+            for k in candidates:
+                seg = segs[k]
+                xs = [t for p in paths
+                      if (t:=pathSegCollision(p, seg)) is not None]
+                if xs:
+                    narrow += 1
+                    t = min(xs)
+                    if x is None or t < x: x = t
+            broad += len(candidates)
+
+            if self.grid is not None:
+                (rx, ry), (rx_, ry_) = b.position, b_.position
+                t = self.grid.sweepBox(vs[0], vs[3], (rx_ - rx, ry_ - ry))
+                if t is not None and (x is None or t < x): x = t
 
             # bad approximation via interpolation
             b__: AxisAlignedBox
@@ -101,3 +166,240 @@ class AASystem:
                 b__ = b_
 
             self.boxes[i] = b__
+
+        if self.collectStats:
+            cells = 0 if self.grid is None else self.grid.cellsTested - cells0
+            self.stats = AAStepStats(len(self.boxes), broad, narrow, cells)
+
+
+class AxisAlignedBoxView:
+    '''
+    Read-only view of box `index` in an `AASystemSoA`; reads through to the
+    system's arrays, so it always shows the current state.
+    '''
+
+    __slots__ = ('_system', '_index')
+
+    def __init__(self, system: AASystemSoA, index: int) -> None:
+        self._system = system
+        self._index = index
+
+    @property
+    def position(self) -> R2:
+        x, y = self._system.positions[self._index]
+        return float(x), float(y)
+
+    @property
+    def velocity(self) -> R2:
+        x, y = self._system.velocities[self._index]
+        return float(x), float(y)
+
+    @property
+    def size(self) -> R2:
+        x, y = self._system.sizes[self._index]
+        return float(x), float(y)
+
+    @property
+    def mass(self) -> float:
+        return float(self._system.masses[self._index])
+
+    def vertices(self) -> tuple[R2, R2, R2, R2]:
+        return AxisAlignedBox(
+            self.position, self.velocity, self.size, self.mass).vertices()
+
+    def snapshot(self) -> AxisAlignedBox:
+        return AxisAlignedBox(
+            self.position, self.velocity, self.size, self.mass)
+
+
+class AASystemSoA:
+    '''
+    Same physics as `AASystem`, but box state lives in contiguous NumPy arrays
+    (struct of arrays) and every box is integrated in one vectorized step, so
+    there is no per-box object churn. Platforms are kept sorted by height, so
+    each box is only tested against the platforms its swept box overlaps,
+    and the pairs are tested in blocks of at most `PAIRS_PER_BLOCK`.
+
+    Boxes and platforms are added with `addBox`/`addPlatform`; state is read
+    back through the read-only array views `positions`, `velocities`, `sizes`
+    and `masses`, or per box through `boxes`.
+    '''
+
+    gravAccel: R2
+
+    _n: int
+    _pos: np.ndarray    # (capacity, 2)
+    _vel: np.ndarray    # (capacity, 2)
+    _size: np.ndarray   # (capacity, 2)
+    _mass: np.ndarray   # (capacity,)
+    _platforms: list[AxisAlignedPlatform]
+    _segs: np.ndarray   # (#platforms, 2, 2)
+    # platform indices sorted by height, and the sorted heights
+    _byY: tuple[np.ndarray, np.ndarray] | None
+
+    # box-platform pairs tested per block of boxes in `step`, to cap memory
+    PAIRS_PER_BLOCK: ClassVar[int] = 1 << 16
+
+    def __init__(
+            self,
+            boxes: list[AxisAlignedBox],
+            platforms: list[AxisAlignedPlatform],
+            gravAccel: R2,
+            ) -> None:
+        self.gravAccel = gravAccel
+        self._n = 0
+        cap = max(len(boxes), 16)
+        self._pos = np.zeros((cap, 2))
+        self._vel = np.zeros((cap, 2))
+        self._size = np.zeros((cap, 2))
+        self._mass = np.zeros(cap)
+        self._platforms = []
+        self._segs = np.zeros((0, 2, 2))
+        self._byY = None
+        for b in boxes: self.addBox(b)
+        for pl in platforms: self.addPlatform(pl)
+
+    @staticmethod
+    def _readonly(a: np.ndarray) -> np.ndarray:
+        v = a.view()
+        v.flags.writeable = False
+        return v
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._readonly(self._pos[:self._n])
+
+    @property
+    def velocities(self) -> np.ndarray:
+        return self._readonly(self._vel[:self._n])
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return self._readonly(self._size[:self._n])
+
+    @property
+    def masses(self) -> np.ndarray:
+        return self._readonly(self._mass[:self._n])
+
+    @property
+    def boxes(self) -> tuple[AxisAlignedBoxView, ...]:
+        return tuple(AxisAlignedBoxView(self, i) for i in range(self._n))
+
+    @property
+    def platforms(self) -> tuple[AxisAlignedPlatform, ...]:
+        return tuple(self._platforms)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def addBox(self, box: AxisAlignedBox) -> int:
+        # appends a copy of `box`'s state; returns its index
+        if self._n == len(self._mass):
+            cap = 2 * len(self._mass)
+            for name in ('_pos', '_vel', '_size', '_mass'):
+                old = getattr(self, name)
+                new = np.zeros((cap,) + old.shape[1:])
+                new[:self._n] = old[:self._n]
+                setattr(self, name, new)
+        i = self._n
+        self._pos[i] = box.position
+        self._vel[i] = box.velocity
+        self._size[i] = box.size
+        self._mass[i] = box.mass
+        self._n += 1
+        return i
+
+    def addPlatform(self, platform: AxisAlignedPlatform) -> None:
+        self._platforms.append(dataclasses.replace(platform))
+        self._segs = np.concatenate(
+            (self._segs, np.array([platform.segment()], dtype=np.float64)))
+        self._byY = None
+
+    def setState(self, positions: ArrayLike, velocities: ArrayLike) -> None:
+        # overwrites the positions and velocities of all boxes at once
+        self._pos[:self._n] = positions
+        self._vel[:self._n] = velocities
+
+    def _candidates(
+            self, lo: np.ndarray, hi: np.ndarray, first: np.ndarray,
+            counts: np.ndarray,
+            ) -> tuple[np.ndarray, np.ndarray]:
+        # (box, platform) index pairs where the platform overlaps the box's
+        # swept AABB [lo, hi]; box i's platforms at the right height are
+        # `counts[i]` entries of `_byY` from `first[i]` on
+        order, _ = self._byY  # type: ignore
+        box = np.repeat(np.arange(len(lo)), counts)
+        offsets = np.cumsum(counts) - counts
+        plat = order[np.arange(len(box)) - np.repeat(offsets - first, counts)]
+        segs = self._segs[plat]
+        keep = (
+            (np.minimum(segs[:, 0, 0], segs[:, 1, 0]) <= hi[box, 0])
+            & (np.maximum(segs[:, 0, 0], segs[:, 1, 0]) >= lo[box, 0]))
+        return box[keep], plat[keep]
+
+    def _collide(
+            self, r: np.ndarray, r_: np.ndarray, h: np.ndarray,
+            ) -> np.ndarray:
+        # per box moving from `r` to `r_` (half sizes `h`), how far along the
+        # move (0 to 1) its first vertex hits a platform, or inf
+        n = len(r)
+        xs = np.full(n, np.inf)
+        lo = np.minimum(r, r_) - h
+        hi = np.maximum(r, r_) + h
+
+        # broad phase: platforms are horizontal, so those a box can hit are
+        # found by height in the sorted platforms, then checked along x
+        if self._byY is None:
+            order = np.argsort(self._segs[:, 0, 1], kind='stable')
+            self._byY = order, self._segs[order, 0, 1]
+        _, ys = self._byY
+        first = np.searchsorted(ys, lo[:, 1], 'left')
+        counts = np.searchsorted(ys, hi[:, 1], 'right') - first
+        ends = np.cumsum(counts)
+
+        # vertex paths in the order of `AxisAlignedBox.vertices`
+        signs = np.array([(-1, -1), (-1, 1), (1, -1), (1, 1)])
+        start = 0
+        while start < n:
+            # as many boxes as fit in `PAIRS_PER_BLOCK` pairs, at least one
+            limit = ends[start] - counts[start] + self.PAIRS_PER_BLOCK
+            stop = max(int(np.searchsorted(ends, limit, 'right')), start + 1)
+            box, plat = self._candidates(
+                lo[start:stop], hi[start:stop], first[start:stop],
+                counts[start:stop])
+            if len(box):
+                b = box + start
+                corners = h[b, None, :] * signs     # (pairs, 4, 2)
+                paths = np.stack(
+                    (r[b, None, :] + corners, r_[b, None, :] + corners),
+                    axis=2)
+                t = pathSegCollisionPairs(paths, self._segs[plat, None])
+                np.minimum.at(
+                    xs, b, np.where(np.isnan(t), np.inf, t).min(axis=1))
+            start = stop
+        return xs
+
+    def step(self, deltaTime: float) -> None:
+        n = self._n
+        if n == 0: return
+        r = self._pos[:n]
+        v = self._vel[:n]
+        m = self._mass[:n, None]
+        h = self._size[:n] / 2
+
+        # same integration as `AxisAlignedBox.step`, for all boxes at once
+        a = (m * np.asarray(self.gravAccel)) / m
+        v_ = v + a*deltaTime
+        r_ = r + (v + v_)/2 * deltaTime
+
+        if len(self._segs):
+            xs = self._collide(r, r_, h)
+            hit = np.isfinite(xs)
+
+            # bad approximation via interpolation, as in `AASystem.step`
+            x = xs[hit]
+            r_[hit, 1] = r[hit, 1]*(1 - x) + r_[hit, 1]*x
+            v_[hit, 1] = 0
+
+        r[:] = r_
+        v[:] = v_
@@ -0,0 +1,204 @@
+from __future__ import annotations
+import dataclasses
+import multiprocessing as mp
+import numpy as np
+import os
+from axis_aligned_box import AASystem, AASystemSoA
+from collections.abc import Sequence
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Union
+
+World = Union[AASystem, AASystemSoA]
+
+
+def _getState(system: World, pos: np.ndarray, vel: np.ndarray) -> None:
+    # copies the positions and velocities of `system`'s boxes into the arrays
+    if isinstance(system, AASystemSoA):
+        pos[:] = system.positions
+        vel[:] = system.velocities
+    else:
+        for i, b in enumerate(system.boxes):
+            pos[i] = b.position
+            vel[i] = b.velocity
+
+def _setState(system: World, pos: np.ndarray, vel: np.ndarray) -> None:
+    # the other way round
+    if isinstance(system, AASystemSoA):
+        system.setState(pos, vel)
+    else:
+        for i, (p, v) in enumerate(zip(pos.tolist(), vel.tolist())):
+            system.boxes[i] = dataclasses.replace(
+                system.boxes[i], position=tuple(p), velocity=tuple(v))
+
+
+def _worker(
+        conn: Connection,
+        shmName: str,
+        nBoxes: int,
+        worlds: list[tuple[int, int, World]],
+        deltaTime: float,
+        ) -> None:
+    # runs in a worker process: steps its share of the worlds on request,
+    # with box state going in and out through the shared arrays
+    shm = SharedMemory(shmName)
+    try:
+        state = np.ndarray((2, nBoxes, 2), dtype=np.float64, buffer=shm.buf)
+        pos, vel = state
+        while True:
+            cmd, arg = conn.recv()
+            try:
+                if cmd == 'step':
+                    for a, b, system in worlds:
+                        _setState(system, pos[a:b], vel[a:b])
+                        for _ in range(arg): system.step(deltaTime)
+                        _getState(system, pos[a:b], vel[a:b])
+                    conn.send(None)
+                elif cmd == 'systems':
+                    for a, b, system in worlds:
+                        _setState(system, pos[a:b], vel[a:b])
+                    conn.send([system for _, _, system in worlds])
+                elif cmd == 'close':
+                    break
+            except Exception as e:
+                conn.send(e)
+        del state, pos, vel  # releases the buffer exported by the memory
+    finally:
+        shm.close()
+
+
+class BatchSimulator:
+    '''
+    Steps many independent worlds (`AASystem`s or `AASystemSoA`s) in parallel,
+    on a pool of persistent worker processes.
+
+    Worlds are handed to the workers once, at construction, and stay there.
+    Box positions and velocities of all worlds live in one shared memory
+    block, exposed as the (total boxes, 2) arrays `positions` and
+    `velocities`, with `span(i)` giving world i's rows; each `step(ticks)`
+    only sends the workers a short command, and they read and write the
+    state in place, so nothing is pickled per tick. The arrays may also be
+    written to between steps, e.g. to reset a world.
+
+    The set of boxes and platforms is fixed once the worlds are handed over;
+    `systems()` returns copies of the worlds as they are now. Use as a
+    context manager, or call `close`, to stop the workers.
+
+    Usage example:
+
+        with BatchSimulator(worlds, fixedDeltaTime=1/120) as batch:
+            batch.step(120)  # one simulated second in every world
+            a, b = batch.span(0)
+            print(batch.positions[a:b])
+    '''
+
+    fixedDeltaTime: float
+    positions: np.ndarray   # (total boxes, 2), shared with the workers
+    velocities: np.ndarray  # (total boxes, 2), shared with the workers
+    ticks: int              # ticks stepped so far
+
+    _spans: list[tuple[int, int]]
+    _order: list[tuple[int, int]]  # world -> (worker, index in worker)
+    _shm: SharedMemory
+    _conns: list[Connection]
+    _procs: list[Any]
+
+    def __init__(
+            self,
+            systems: Sequence[World],
+            fixedDeltaTime: float = 1/120,
+            workers: int | None = None,
+            ) -> None:
+        if not fixedDeltaTime > 0:
+            raise ValueError(
+                f"fixedDeltaTime must be positive, got {fixedDeltaTime!r}")
+        self.fixedDeltaTime = fixedDeltaTime
+        self.ticks = 0
+
+        self._spans = []
+        n = 0
+        for system in systems:
+            self._spans.append((n, n + len(system.boxes)))
+            n = self._spans[-1][1]
+        self._shm = SharedMemory(create=True, size=max(2*n*2*8, 1))
+        state = np.ndarray((2, n, 2), dtype=np.float64, buffer=self._shm.buf)
+        self.positions, self.velocities = state
+        for system, (a, b) in zip(systems, self._spans):
+            _getState(system, self.positions[a:b], self.velocities[a:b])
+
+        # worlds are dealt out round-robin, so big and small ones mix
+        nWorkers = max(1, min(workers or os.cpu_count() or 1, len(systems)))
+        shares: list[list[tuple[int, int, World]]] = [
+            [] for _ in range(nWorkers)]
+        self._order = []
+        for i, (system, (a, b)) in enumerate(zip(systems, self._spans)):
+            share = shares[i % nWorkers]
+            self._order.append((i % nWorkers, len(share)))
+            share.append((a, b, system))
+
+        self._conns, self._procs = [], []
+        try:
+            for share in shares:
+                parent, child = mp.Pipe()
+                proc = mp.Process(
+                    target=_worker,
+                    args=(child, self._shm.name, n, share, fixedDeltaTime),
+                    daemon=True)
+                proc.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(proc)
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def span(self, i: int) -> tuple[int, int]:
+        # rows [a, b) of `positions` and `velocities` holding world i's boxes
+        return self._spans[i]
+
+    def _request(self, cmd: str, arg: Any = None) -> list[Any]:
+        # sends a command to every worker, then waits for all of them
+        for conn in self._conns:
+            conn.send((cmd, arg))
+        replies = [conn.recv() for conn in self._conns]
+        for r in replies:
+            if isinstance(r, Exception):
+                raise r
+        return replies
+
+    def step(self, ticks: int = 1) -> None:
+        # steps every world `ticks` times by `fixedDeltaTime`
+        if ticks < 0:
+            raise ValueError(f"ticks must not be negative, got {ticks!r}")
+        self._request('step', ticks)
+        self.ticks += ticks
+
+    def systems(self) -> list[World]:
+        # copies of the worlds in their current state
+        replies = self._request('systems')
+        return [replies[w][k] for w, k in self._order]
+
+    def close(self) -> None:
+        for conn in self._conns:
+            try:
+                conn.send(('close', None))
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._procs = [], []
+        if hasattr(self, 'positions'):
+            del self.positions, self.velocities
+            self._shm.close()
+            self._shm.unlink()
+
+    def __enter__(self) -> BatchSimulator:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
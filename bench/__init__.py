@@ -0,0 +1 @@
+# Headless benchmarks; run `python -m bench --help` from the repo root.
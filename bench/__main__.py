@@ -0,0 +1,74 @@
+from __future__ import annotations
+import argparse
+import fnmatch
+import sys
+from bench import workloads as _workloads  # registers the benchmarks
+from bench.harness import (
+    BENCHMARKS, compare, formatTable, loadBaseline, run, saveBaseline)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m bench',
+        description="Run the headless benchmarks, optionally against a "
+                    "baseline saved by an earlier run.")
+    parser.add_argument(
+        'patterns', nargs='*', metavar='PATTERN',
+        help="only run benchmarks whose names match these glob patterns")
+    parser.add_argument('--list', action='store_true', help="list and exit")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--quick', action='store_true', help="small workloads, e.g. for CI")
+    parser.add_argument(
+        '--min-time', type=float, default=0.5,
+        help="seconds to spend measuring each benchmark (default: 0.5)")
+    parser.add_argument(
+        '--baseline', metavar='JSON',
+        help="compare with this baseline; exit with status 1 on regressions")
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25,
+        help="allowed slowdown or memory growth vs the baseline "
+             "(default: 0.25, i.e. 25%%)")
+    parser.add_argument(
+        '--save', metavar='JSON', help="save the results as a baseline")
+    args = parser.parse_args()
+
+    names = [
+        name for name in BENCHMARKS
+        if not args.patterns
+        or any(fnmatch.fnmatch(name, p) for p in args.patterns)]
+    if args.list:
+        print('\n'.join(names))
+        return
+    if not names:
+        sys.exit("no benchmark matches")
+
+    results = []
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr)
+        results.append(run(
+            BENCHMARKS[name], seed=args.seed, quick=args.quick,
+            minTime=args.min_time))
+    print(formatTable(results))
+
+    if args.save:
+        saveBaseline(args.save, results)
+        print(f"saved baseline to {args.save}")
+
+    if args.baseline:
+        baseline = loadBaseline(args.baseline)
+        failed = False
+        for r in results:
+            if r.name not in baseline:
+                print(f"NEW        {r.name}: not in baseline")
+                continue
+            problems = compare(r, baseline[r.name], args.tolerance)
+            for p in problems:
+                print(f"REGRESSION {r.name}: {p}")
+            failed |= bool(problems)
+        if failed:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
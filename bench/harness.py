@@ -0,0 +1,159 @@
+from __future__ import annotations
+import dataclasses
+import gc
+import json
+import math
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+
+@dataclasses.dataclass
+class Workload:
+    op: Callable[[], Any]  # one measured call
+    opsPerCall: int        # units of work per call, e.g. segments tested
+    # per-call figures worth reporting besides time, e.g. canvas items drawn;
+    # `op` may update them
+    counters: dict[str, float] = dataclasses.field(default_factory=dict)
+
+
+# A benchmark is a setup function taking the random seed and the workload
+# size, and returning the workload; setup is not measured.
+Setup = Callable[[int, int], Workload]
+
+
+@dataclasses.dataclass
+class Benchmark:
+    name: str
+    setup: Setup
+    size: int        # workload size for full runs
+    quickSize: int   # workload size for `--quick` runs
+
+
+@dataclasses.dataclass
+class BenchResult:
+    name: str
+    size: int
+    calls: int
+    opsPerSec: float
+    p50: float       # seconds per call
+    p99: float       # seconds per call
+    peakBytes: int   # peak traced allocation during one call
+    counters: dict[str, float] = dataclasses.field(default_factory=dict)
+
+    def toJSON(self) -> dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, size: int, quickSize: int) -> Callable[[Setup], Setup]:
+    # registers a setup function under `name`
+    def register(setup: Setup) -> Setup:
+        if name in BENCHMARKS:
+            raise ValueError(f"benchmark {name!r} is already registered")
+        BENCHMARKS[name] = Benchmark(name, setup, size, quickSize)
+        return setup
+    return register
+
+
+def percentile(sortedSamples: list[float], q: float) -> float:
+    # nearest-rank percentile, q in [0, 100]
+    k = max(0, math.ceil(q / 100 * len(sortedSamples)) - 1)
+    return sortedSamples[k]
+
+
+def run(
+        bench: Benchmark,
+        seed: int = 0,
+        quick: bool = False,
+        minTime: float = 0.5,
+        minCalls: int = 5,
+        ) -> BenchResult:
+    size = bench.quickSize if quick else bench.size
+    workload = bench.setup(seed, size)
+    op = workload.op
+    op()  # warm-up: caches, lazy imports
+
+    # peak memory of one call, traced separately since tracing is slow
+    gc.collect()
+    tracemalloc.start()
+    try:
+        op()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    samples: list[float] = []
+    began = time.perf_counter()
+    while len(samples) < minCalls or time.perf_counter() - began < minTime:
+        t = time.perf_counter()
+        op()
+        samples.append(time.perf_counter() - t)
+    total = sum(samples)
+    samples.sort()
+    return BenchResult(
+        bench.name, size, len(samples),
+        workload.opsPerCall * len(samples) / total if total > 0 else math.inf,
+        percentile(samples, 50), percentile(samples, 99), peak,
+        dict(workload.counters))
+
+
+def loadBaseline(path: Path | str) -> dict[str, dict[str, Any]]:
+    with open(path) as f:
+        data = json.load(f)
+    return {r['name']: r for r in data['results']}
+
+def saveBaseline(path: Path | str, results: list[BenchResult]) -> None:
+    with open(path, 'w') as f:
+        json.dump({'results': [r.toJSON() for r in results]}, f, indent=2)
+
+
+def compare(
+        result: BenchResult,
+        baseline: dict[str, Any],
+        tolerance: float,
+        ) -> list[str]:
+    # regressions of `result` against its baseline entry, as messages; only
+    # throughput and peak memory are compared, as p99 is too noisy
+    if baseline['size'] != result.size:
+        return [f"size {result.size} differs from baseline {baseline['size']}"]
+    problems: list[str] = []
+    ratio = result.opsPerSec / baseline['opsPerSec']
+    if ratio < 1 - tolerance:
+        problems.append(
+            f"throughput {ratio:.0%} of baseline "
+            f"({result.opsPerSec:,.0f} vs {baseline['opsPerSec']:,.0f} ops/s)")
+    if result.peakBytes > baseline['peakBytes'] * (1 + tolerance) + 4096:
+        problems.append(
+            f"peak memory {result.peakBytes:,} B vs "
+            f"{baseline['peakBytes']:,} B in baseline")
+    return problems
+
+
+def formatTable(results: list[BenchResult]) -> str:
+    rows = [
+        ("benchmark", "size", "ops/s", "p50", "p99", "peak mem", "counters")]
+    for r in results:
+        rows.append((
+            r.name, str(r.size), f"{r.opsPerSec:,.0f}",
+            _formatSeconds(r.p50), _formatSeconds(r.p99),
+            f"{r.peakBytes / 1024:,.1f} KiB",
+            ' '.join(f"{k}={v:g}" for k, v in r.counters.items())))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join(
+        '  '.join(
+            cell.ljust(w) if i in (0, len(row) - 1) else cell.rjust(w)
+            for i, (cell, w) in enumerate(zip(row, widths))).rstrip()
+        for row in rows)
+
+def _formatSeconds(t: float) -> str:
+    if t >= 1:
+        return f"{t:.2f} s"
+    elif t >= 1E-3:
+        return f"{t * 1E3:.2f} ms"
+    else:
+        return f"{t * 1E6:.1f} us"
@@ -0,0 +1,239 @@
+from __future__ import annotations
+import io
+import numpy as np
+from PIL import Image
+from bench.harness import Workload, benchmark
+from typing import Any
+
+# Seeded workloads for the modules at the top of the repo. Each setup builds
+# its inputs from `np.random.default_rng(seed)`, so runs are reproducible.
+
+
+def _randomSegments(
+        rng: np.random.Generator, n: int, extent: float = 100.0,
+        maxLen: float = 10.0,
+        ) -> np.ndarray:
+    # (n, 2, 2) segments with endpoints in [0, extent)^2
+    a = rng.uniform(0, extent, (n, 2))
+    b = a + rng.uniform(-maxLen, maxLen, (n, 2))
+    return np.stack((a, b), axis=1)
+
+def _asPairs(segs: np.ndarray) -> list[tuple[tuple[float, float], ...]]:
+    return [tuple(map(tuple, s)) for s in segs.tolist()]
+
+
+@benchmark('intersection.pathSegCollision', size=2000, quickSize=200)
+def _pathSegCollision(seed: int, n: int) -> Workload:
+    from intersection import pathSegCollision
+    rng = np.random.default_rng(seed)
+    segs = _asPairs(_randomSegments(rng, n))
+    path = ((0.0, 0.0), (100.0, 100.0))
+    def op() -> None:
+        for seg in segs:
+            pathSegCollision(path, seg)
+    return Workload(op, n)
+
+@benchmark('intersection.pathSegCollisionBatch', size=2000, quickSize=200)
+def _pathSegCollisionBatch(seed: int, n: int) -> Workload:
+    from intersection import pathSegCollisionBatch
+    rng = np.random.default_rng(seed)
+    segs = _randomSegments(rng, n)
+    paths = np.array([((0.0, 0.0), (100.0, 100.0))])
+    return Workload(lambda: pathSegCollisionBatch(paths, segs), n)
+
+@benchmark('intersection.SegmentIndex.query_path', size=20000, quickSize=2000)
+def _segmentIndexQuery(seed: int, n: int) -> Workload:
+    from intersection import SegmentIndex
+    rng = np.random.default_rng(seed)
+    index = SegmentIndex(cellSize=10.0)
+    for seg in _asPairs(_randomSegments(rng, n)):
+        index.insert(seg)
+    paths = _asPairs(_randomSegments(rng, 100, maxLen=30.0))
+    def op() -> None:
+        for path in paths:
+            index.query_path(path)
+    return Workload(op, len(paths))
+
+
+def _boxesAndPlatforms(
+        rng: np.random.Generator, nBoxes: int, nPlatforms: int,
+        ) -> tuple[list[Any], list[Any]]:
+    from axis_aligned_box import AxisAlignedBox, AxisAlignedPlatform
+    boxes = [
+        AxisAlignedBox(
+            (float(x), float(y)), (float(vx), 0.0), (1.0, 1.0), 1.0)
+        for x, y, vx in zip(
+            rng.uniform(0, 100, nBoxes), rng.uniform(0, 100, nBoxes),
+            rng.uniform(-3, 3, nBoxes))]
+    platforms = [
+        AxisAlignedPlatform((float(x), float(y)), float(w))
+        for x, y, w in zip(
+            rng.uniform(0, 100, nPlatforms), rng.uniform(0, 100, nPlatforms),
+            rng.uniform(2, 10, nPlatforms))]
+    return boxes, platforms
+
+@benchmark('AASystem.step', size=200, quickSize=40)
+def _aaSystemStep(seed: int, nBoxes: int) -> Workload:
+    # `nBoxes` boxes over half as many platforms, stepping at 120 Hz
+    from axis_aligned_box import AASystem
+    rng = np.random.default_rng(seed)
+    boxes, platforms = _boxesAndPlatforms(rng, nBoxes, nBoxes // 2)
+    system = AASystem(boxes, platforms, (0.0, -9.8))
+    return Workload(lambda: system.step(1/120), nBoxes)
+
+@benchmark('AASystemSoA.step', size=200, quickSize=40)
+def _aaSystemSoAStep(seed: int, nBoxes: int) -> Workload:
+    from axis_aligned_box import AASystemSoA
+    rng = np.random.default_rng(seed)
+    boxes, platforms = _boxesAndPlatforms(rng, nBoxes, nBoxes // 2)
+    system = AASystemSoA(boxes, platforms, (0.0, -9.8))
+    return Workload(lambda: system.step(1/120), nBoxes)
+
+
+def _terrainIds(rng: np.random.Generator, w: int, h: int) -> np.ndarray:
+    # (w, h) block IDs of rolling terrain: air above, grass, then dirt
+    from blocks import blockRegistry
+    reg = blockRegistry()
+    x = np.arange(w)
+    surface = (h/2 + h/8*np.sin(x / 12) + rng.integers(-1, 2, w)).astype(int)
+    iy = np.arange(h)[None, :]
+    ids = np.full((w, h), reg.ids['air'], dtype=reg.idDtype)
+    ids[iy > surface[:, None]] = reg.ids['dirt']
+    ids[iy == surface[:, None]] = reg.ids['grass']
+    return ids
+
+def _mapImage(ids: np.ndarray) -> Image.Image:
+    # the map image (in the map legend format) of a (w, h) block ID array
+    from blocks import blockRegistry
+    legends = np.array(
+        [spec.mapLegend for spec in blockRegistry().table], dtype=np.uint8)
+    return Image.fromarray(legends[ids.T])
+
+def _gridLoad(seed: int, n: int) -> Workload:
+    # decoding an n x n map PNG, as `Grid.__init__` does
+    from grids import Grid
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    _mapImage(_terrainIds(rng, n, n)).save(buf, format='PNG')
+    data = buf.getvalue()
+    def op() -> None:
+        with Image.open(io.BytesIO(data)) as img:
+            Grid.fromImage(img)
+    return Workload(op, n*n)
+
+# maps of increasing size, named by their full-run size
+for _n in (256, 1024, 2048):
+    benchmark(f'Grid load {_n}', size=_n, quickSize=_n // 8)(_gridLoad)
+del _n
+
+
+class _PassthroughPhotoImage:
+    # stands in for `ImageTk.PhotoImage`, which needs a Tk root window
+    def __init__(self, image: Image.Image) -> None:
+        self._image = image
+    def width(self) -> int:
+        return self._image.width
+    def height(self) -> int:
+        return self._image.height
+    def paste(self, image: Image.Image) -> None:
+        self._image = image
+
+class StubTkRenderer:
+    '''
+    Stands in for a `TkRenderer` without Tk or a display: takes the same
+    PhotoImage path through `Grid.render`, with pass-through PhotoImages, and
+    counts the canvas items a Tk canvas would get in `calls`.
+    '''
+
+    width: int
+    height: int
+    calls: int
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width, self.height = width, height
+        self.calls = 0
+
+    def toPhoto(self, image: Image.Image) -> Any:
+        return _PassthroughPhotoImage(image)
+
+    def photo(self, x: int, y: int, photo: Any) -> None:
+        self.calls += 1
+
+    def image(self, x: int, y: int, image: Image.Image) -> None:
+        self.calls += 1
+
+    def rectangle(self, *args: Any, **kwargs: Any) -> None:
+        self.calls += 1
+
+    def line(self, *args: Any, **kwargs: Any) -> None:
+        self.calls += 1
+
+def _gridDraw(seed: int, n: int, mode: str) -> Workload:
+    # one 800x600 frame of an n x n map at 16 px/block, centered, as
+    # `Grid.draw` draws it on a Tk canvas
+    from grids import Grid
+    rng = np.random.default_rng(seed)
+    grid = Grid.fromImage(_mapImage(_terrainIds(rng, n, n)))
+    counters = {'canvasItems': 0.0}
+    def op() -> None:
+        renderer = StubTkRenderer(800, 600)
+        grid.render(renderer, 16, (n*8, n*8), mode=mode)
+        counters['canvasItems'] = renderer.calls
+    return Workload(op, 1, counters)
+
+@benchmark('Grid.draw tiles', size=256, quickSize=64)
+def _gridDrawTiles(seed: int, n: int) -> Workload:
+    return _gridDraw(seed, n, 'tiles')
+
+@benchmark('Grid.draw chunks', size=256, quickSize=64)
+def _gridDrawChunks(seed: int, n: int) -> Workload:
+    return _gridDraw(seed, n, 'chunks')
+
+def _gridRender(seed: int, n: int, mode: str) -> Workload:
+    # as `_gridDraw`, into a framebuffer: the cost of drawing without Tk
+    from grids import Grid
+    from renderer import FramebufferRenderer
+    rng = np.random.default_rng(seed)
+    grid = Grid.fromImage(_mapImage(_terrainIds(rng, n, n)))
+    fb = FramebufferRenderer(800, 600, '#94CFE5')
+    def op() -> None:
+        fb.clear()
+        grid.render(fb, 16, (n*8, n*8), mode=mode)
+    return Workload(op, 1)
+
+@benchmark('Grid.render framebuffer tiles', size=256, quickSize=64)
+def _gridRenderTiles(seed: int, n: int) -> Workload:
+    return _gridRender(seed, n, 'tiles')
+
+@benchmark('Grid.render framebuffer chunks', size=256, quickSize=64)
+def _gridRenderChunks(seed: int, n: int) -> Workload:
+    return _gridRender(seed, n, 'chunks')
+
+
+@benchmark('ESync throughput', size=10000, quickSize=1000)
+def _esyncThroughput(seed: int, n: int) -> Workload:
+    # n mouse events queued and dispatched by one hooked tick
+    from eventsync import ESync
+    rng = np.random.default_rng(seed)
+    xs = rng.integers(0, 800, n).tolist()
+
+    class Event:
+        __slots__ = ('x', 'y')
+    events = []
+    for x in xs:
+        e = Event()
+        e.x, e.y = x, 0
+        events.append(e)
+
+    seen = [0]
+    @ESync.mouse
+    def mouseMoved(app: Any, event: Any) -> None:
+        seen[0] += 1
+    @ESync.hook
+    def timerFired(app: Any) -> None:
+        pass
+    def op() -> None:
+        for e in events:
+            mouseMoved(None, e)
+        timerFired(None)
+    return Workload(op, n)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import json
+import numpy as np
+from PIL import Image
+from custom_types import R2
+from functools import cache
+from texture_atlas import TextureAtlas, blockTextureNames
+from texture_cache import TextureCache
+from typing import TYPE_CHECKING, Any, Final
+from util import RCSDIR
+
+if TYPE_CHECKING:
+    from PIL import ImageTk
+    from renderer import PhotoRenderer
+
+# Block kinds and their textures, without Tk. Nothing is read from disk at
+# import: block_types.json is parsed on first use of `blockRegistry()` (or of
+# one of the BLOCK_* names below), and textures on first draw.
+
+
+# scaled block textures, PIL and Tk, for every BlockSpec; set
+# `TEXTURE_CACHE.stepsPerOctave` to snap zoom levels to a few mip buckets
+TEXTURE_CACHE: Final = TextureCache()
+
+
+def quantizeZoom(blockSidelen: int, originCartesian: R2) -> tuple[int, R2]:
+    # block size snapped by `TEXTURE_CACHE.quantize`, and the camera origin
+    # rescaled to match so that the same spot stays centered
+    a = TEXTURE_CACHE.quantize(blockSidelen)
+    if a == blockSidelen:
+        return a, originCartesian
+    ox, oy = originCartesian
+    k = a / blockSidelen
+    return a, (ox*k, oy*k)
+
+
+class BlockSpec:
+
+    textureName: str | None
+    mapLegend: tuple[int, int, int]
+    solid: bool  # whether boxes collide with it; defaults to having a texture
+
+    def __init__(self, data) -> None:
+        ver = data['blockspec_version']
+        if ver == 1:
+            self.__init_specver_1(data)
+        else:
+            raise ValueError(f"blockspec_version {ver!r} is not recognized")
+
+    def __init_specver_1(self, data) -> None:
+        self.textureName = data['texture']
+        self.mapLegend = tuple(data['map_legend'])  # type: ignore
+        self.solid = bool(data.get('solid', self.textureName is not None))
+
+    @property
+    def texture(self) -> Image.Image | None:
+        # the texture at its own size
+        if self.textureName is None:
+            return None
+        else:
+            return blockAtlas().native(self.textureName)
+
+    def scaled_texture(self, sidelen: int) -> Image.Image | None:
+        txrName = self.textureName
+        if txrName is None:
+            return None
+        else:
+            return TEXTURE_CACHE.get(
+                (self, sidelen), lambda: blockAtlas().scaled(txrName, sidelen))
+
+    def scaled_texture_tk(
+            self, sidelen: int, renderer: PhotoRenderer,
+            ) -> ImageTk.PhotoImage | None:
+        # made by `renderer.toPhoto`, and cached per type of renderer
+        txr = self.scaled_texture(sidelen)
+        if txr is None:
+            return None
+        else:
+            return TEXTURE_CACHE.get(
+                (self, sidelen, type(renderer)),
+                lambda: renderer.toPhoto(txr))
+
+
+class BlockRegistry:
+    '''
+    Every block kind in a block_types.json, indexed every way grids need.
+
+    Grids store block IDs, which index into `names` and `table`; `legendKeys`
+    holds the map legend colors packed as 0xRRGGBB and sorted, and
+    `legendIds` the matching block IDs, for decoding map images. `solid` is a
+    boolean array indexed by block ID, so `solid[blockIds]` is a solidity mask.
+    '''
+
+    blockTypes: dict[str, Any]
+    specs: dict[str, BlockSpec]
+    invref: dict[tuple[int, int, int], str]  # map legend -> block name
+    names: tuple[str, ...]                   # block ID -> block name
+    table: tuple[BlockSpec, ...]             # block ID -> BlockSpec
+    ids: dict[str, int]                      # block name -> block ID
+    idDtype: type[np.unsignedinteger]
+    legendKeys: np.ndarray
+    legendIds: np.ndarray
+    solid: np.ndarray
+
+    def __init__(self, blockTypes: dict[str, Any]) -> None:
+        self.blockTypes = blockTypes
+        self.specs = { k: BlockSpec(v) for k, v in blockTypes.items() }
+        self.invref = { v.mapLegend: k for k, v in self.specs.items() }
+        self.names = tuple(self.specs)
+        self.table = tuple(self.specs.values())
+        self.ids = { k: i for i, k in enumerate(self.names) }
+        self.idDtype = np.uint8 if len(self.names) <= 0x100 else np.uint16
+        self.legendKeys = np.array(sorted(
+            r << 16 | g << 8 | b for r, g, b in self.invref), dtype=np.uint32)
+        self.legendIds = np.array([
+            self.ids[self.invref[(k >> 16, k >> 8 & 0xFF, k & 0xFF)]]
+            for k in self.legendKeys.tolist()], dtype=self.idDtype)
+        self.solid = np.array([spec.solid for spec in self.table], dtype=bool)
+
+
+@cache
+def blockRegistry() -> BlockRegistry:
+    # the block kinds in resources/block_types.json, parsed on first use
+    with (RCSDIR/'block_types.json').open() as f:
+        return BlockRegistry(json.load(f))
+
+
+@cache
+def blockAtlas() -> TextureAtlas:
+    # all block textures, loaded (or built) on first use
+    return TextureAtlas.loadOrBuild(
+        blockTextureNames(blockRegistry().blockTypes))
+
+
+# module constants resolved from the registry when first looked up
+_REGISTRY_ATTRS: Final = {
+    'BLOCK_SPECS': 'specs',
+    'BLOCK_INVREF': 'invref',
+    'BLOCK_NAMES': 'names',
+    'BLOCK_TABLE': 'table',
+    'BLOCK_IDS': 'ids',
+    'BLOCK_ID_DTYPE': 'idDtype',
+}
+
+def __getattr__(name: str) -> Any:
+    if name in _REGISTRY_ATTRS:
+        return getattr(blockRegistry(), _REGISTRY_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,337 @@
+from __future__ import annotations
+import dataclasses
+import json
+import mmap
+import numpy as np
+import struct
+import sys
+import zlib
+from PIL import Image
+from blocks import blockRegistry, quantizeZoom
+from collections import OrderedDict
+from custom_types import R2
+from gridmap import composeBlocks, decodeMapImage, visibleRange
+from pathlib import Path
+from renderer import PhotoRenderer, Renderer, TkRenderer
+from typing import TYPE_CHECKING, BinaryIO, Final
+
+if TYPE_CHECKING:
+    from PIL import ImageTk
+    from cmu_112_graphics.cmu_112_graphics import TopLevelApp, WrappedCanvas
+
+
+# Chunked map file layout (all integers little-endian):
+#
+#     header  magic b'GXCHUNK1', then u32 width, u32 height (in blocks),
+#             u16 chunk side length, u16 bytes per block ID,
+#             u32 length of the name table
+#     names   JSON list of block names; position in the list is the block ID
+#             used in this file
+#     index   per chunk, row by row (cy major, then cx): u64 offset of the
+#             chunk's data from the start of the file, u32 its length
+#     data    per chunk, zlib-compressed block IDs in C order, indexed
+#             [ix, iy]; chunks on the right and bottom edges may be smaller
+#
+# Block names rather than IDs are what tie a file to the block kinds, so adding
+# block kinds does not invalidate existing files.
+#
+# Reading and writing files needs no Tk; only `ChunkedGrid.draw` does.
+
+CHUNKED_MAGIC: Final = b'GXCHUNK1'
+_HEADER: Final = struct.Struct('<8sIIHHI')
+_INDEX_ENTRY: Final = np.dtype([('offset', '<u8'), ('length', '<u4')])
+
+
+def writeChunkedMap(
+        blockIds: np.ndarray, path: Path | str, chunkSidelen: int = 64,
+        ) -> None:
+    # writes a (w, h) array of block IDs as a chunked map file
+    w, h = blockIds.shape
+    C = chunkSidelen
+    ncx, ncy = -(-w // C), -(-h // C)
+    reg = blockRegistry()
+    names = json.dumps(reg.names).encode()
+    itemsize = np.dtype(reg.idDtype).itemsize
+
+    index = np.zeros(ncx*ncy, dtype=_INDEX_ENTRY)
+    offset = _HEADER.size + len(names) + index.nbytes
+    payloads: list[bytes] = []
+    for cy in range(ncy):
+        for cx in range(ncx):
+            chunk = blockIds[cx*C:(cx+1)*C, cy*C:(cy+1)*C]
+            data = zlib.compress(
+                np.ascontiguousarray(chunk, dtype=reg.idDtype).tobytes())
+            index[cy*ncx + cx] = (offset, len(data))
+            offset += len(data)
+            payloads.append(data)
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(CHUNKED_MAGIC, w, h, C, itemsize, len(names)))
+        f.write(names)
+        f.write(index.tobytes())
+        for data in payloads: f.write(data)
+
+def convertMapImage(
+        mapImg: Image.Image | Path | str, path: Path | str,
+        chunkSidelen: int = 64,
+        ) -> None:
+    # converts a map image in the map legend format (like samplemap.png) into
+    # a chunked map file
+    if not isinstance(mapImg, Image.Image):
+        with Image.open(mapImg) as img:
+            blockIds = decodeMapImage(img)
+    else:
+        blockIds = decodeMapImage(mapImg)
+    writeChunkedMap(blockIds, path, chunkSidelen)
+
+
+@dataclasses.dataclass
+class _ChunkEntry:
+    blockIds: np.ndarray
+    imageSidelen: int | None = None
+    image: Image.Image | None = None
+    photo: ImageTk.PhotoImage | None = None  # made when first drawn with Tk
+    imageBytes: int = 0
+
+    def nbytes(self) -> int:
+        return self.blockIds.nbytes + self.imageBytes
+
+
+class ChunkedGrid:
+    '''
+    A grid map streamed from a chunked map file (see `writeChunkedMap`), for
+    worlds too big to load at once.
+
+    The file is memory-mapped, and chunks are decompressed on first access,
+    e.g. when `render` needs them for the area around the camera. Decoded
+    chunks and their prerendered images are kept in least-recently-used order
+    and evicted once they take more than `memoryBudget` bytes, so memory use
+    is bounded by the budget rather than by the size of the world. The budget
+    should cover at least a screenful of chunks.
+
+    Coordinates and drawing work like `grids.Grid`: `render` draws with any
+    `Renderer`, and `draw` with a Tk canvas.
+    '''
+
+    size: tuple[int, int]
+    chunkSidelen: int
+    memoryBudget: int
+    loads: int
+    evictions: int
+
+    _file: BinaryIO
+    _mm: mmap.mmap
+    _index: np.ndarray
+    _fileDtype: np.dtype
+    _remap: np.ndarray  # file block ID -> block ID
+    _chunks: OrderedDict[tuple[int, int], _ChunkEntry]
+    _bytes: int
+    _onScreen: list[ImageTk.PhotoImage]  # Tk blanks images once collected
+
+    def __init__(self, path: Path | str, memoryBudget: int = 64 << 20) -> None:
+        self._file = f = open(path, 'rb')
+        try:
+            self._mm = mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, w, h, C, itemsize, namesLen = _HEADER.unpack_from(mm, 0)
+            if magic != CHUNKED_MAGIC:
+                raise ValueError(f"{str(path)!r} is not a chunked map file")
+            names = json.loads(mm[_HEADER.size:_HEADER.size + namesLen])
+            reg = blockRegistry()
+            unknown = [n for n in names if n not in reg.ids]
+            if unknown:
+                raise ValueError(f"unknown block kinds in map: {unknown!r}")
+        except BaseException:
+            f.close()
+            raise
+
+        self.size = w, h
+        self.chunkSidelen = C
+        self.memoryBudget = memoryBudget
+        self.loads = self.evictions = 0
+        ncx, ncy = -(-w // C), -(-h // C)
+        self._index = np.frombuffer(
+            mm, dtype=_INDEX_ENTRY, count=ncx*ncy,
+            offset=_HEADER.size + namesLen)
+        self._fileDtype = np.dtype(f'<u{itemsize}')
+        self._remap = np.array(
+            [reg.ids[n] for n in names], dtype=reg.idDtype)
+        self._chunks = OrderedDict()
+        self._bytes = 0
+        self._onScreen = []
+
+    def close(self) -> None:
+        self._chunks.clear()
+        self._onScreen.clear()
+        self._bytes = 0
+        del self._index  # releases the buffer exported by the mmap
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> ChunkedGrid:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @property
+    def chunkCount(self) -> tuple[int, int]:
+        w, h = self.size
+        C = self.chunkSidelen
+        return -(-w // C), -(-h // C)
+
+    @property
+    def residentBytes(self) -> int:
+        return self._bytes
+
+    def _entry(self, cx: int, cy: int, evict: bool = True) -> _ChunkEntry:
+        key = cx, cy
+        entry = self._chunks.get(key)
+        if entry is not None:
+            self._chunks.move_to_end(key)
+            return entry
+
+        ncx, ncy = self.chunkCount
+        if not (0 <= cx < ncx and 0 <= cy < ncy):
+            raise IndexError(f"chunk {key!r} out of range")
+        w, h = self.size
+        C = self.chunkSidelen
+        offset, length = self._index[cy*ncx + cx].tolist()
+        raw = zlib.decompress(self._mm[offset:offset + length])
+        shape = min(C, w - cx*C), min(C, h - cy*C)
+        fileIds = np.frombuffer(raw, dtype=self._fileDtype).reshape(shape)
+        entry = _ChunkEntry(self._remap[fileIds])
+        self.loads += 1
+
+        self._chunks[key] = entry
+        self._bytes += entry.nbytes()
+        if evict: self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        # drops least recently used chunks until within budget; the most
+        # recently used one always stays
+        while self._bytes > self.memoryBudget and len(self._chunks) > 1:
+            _, entry = self._chunks.popitem(last=False)
+            self._bytes -= entry.nbytes()
+            self.evictions += 1
+
+    def chunk(self, cx: int, cy: int) -> np.ndarray:
+        # read-only (w, h) array of the block IDs of chunk (cx, cy)
+        view = self._entry(cx, cy).blockIds.view()
+        view.flags.writeable = False
+        return view
+
+    def getBlock(self, ix: int, iy: int) -> str:
+        C = self.chunkSidelen
+        blockId = self._entry(ix // C, iy // C).blockIds[ix % C, iy % C]
+        return blockRegistry().names[blockId]
+
+    def _visibleChunks(
+            self,
+            windowSize: tuple[int, int],
+            blockSidelen: int,
+            originCartesian: R2,
+            margin: int = 0,
+            ) -> tuple[range, range, int, int]:
+        # chunk ranges overlapping the window (plus `margin` chunks around),
+        # and the window position of block (0, 0); as in `grids.Grid.draw`
+        w, h = self.size
+        a = blockSidelen
+        oriX, oriY = map(round, originCartesian)
+        appW, appH = windowSize
+        oriY = h*a - oriY  # from Cartesian to Window
+        minX = appW // 2 - oriX
+        minY = appH // 2 - oriY
+        ncx, ncy = self.chunkCount
+        span = self.chunkSidelen * a
+        cxs = visibleRange(minX + margin*span, span, ncx, appW + 2*margin*span)
+        cys = visibleRange(minY + margin*span, span, ncy, appH + 2*margin*span)
+        return cxs, cys, minX, minY
+
+    def prefetch(
+            self,
+            windowSize: tuple[int, int],
+            blockSidelen: int,
+            originCartesian: R2,
+            margin: int = 1,
+            ) -> None:
+        # loads the chunks on screen and `margin` chunks around them, so that
+        # panning does not stall on decompression
+        cxs, cys, _, _ = self._visibleChunks(
+            windowSize, blockSidelen, originCartesian, margin)
+        for cx in cxs:
+            for cy in cys:
+                self._entry(cx, cy)
+
+    def _renderEntry(self, entry: _ChunkEntry, a: int) -> None:
+        img = composeBlocks(entry.blockIds, a)
+        self._bytes -= entry.imageBytes
+        entry.imageSidelen = a
+        entry.image, entry.photo = img, None
+        entry.imageBytes = 0 if img is None else 4 * img.width * img.height
+        self._bytes += entry.imageBytes
+
+    def _photo(
+            self, entry: _ChunkEntry, renderer: PhotoRenderer,
+            ) -> ImageTk.PhotoImage:
+        # the Tk copy of `entry.image`, counted against the budget too
+        if entry.photo is None:
+            assert entry.image is not None
+            entry.photo = renderer.toPhoto(entry.image)
+            nbytes = 4 * entry.image.width * entry.image.height
+            entry.imageBytes += nbytes
+            self._bytes += nbytes
+        return entry.photo
+
+    def draw(
+            self,
+            app: TopLevelApp,
+            canvas: WrappedCanvas,
+            blockSidelen: int,
+            originCartesian: R2,
+            ) -> None:
+        self.render(TkRenderer(app, canvas), blockSidelen, originCartesian)
+
+    def render(
+            self,
+            renderer: Renderer,
+            blockSidelen: int,
+            originCartesian: R2,
+            ) -> None:
+        a, originCartesian = quantizeZoom(blockSidelen, originCartesian)
+        C = self.chunkSidelen
+        cxs, cys, minX, minY = self._visibleChunks(
+            (renderer.width, renderer.height), a, originCartesian)
+        # Tk renderers take PhotoImages, made once per chunk image
+        tkRenderer = (
+            renderer if isinstance(renderer, PhotoRenderer) else None)
+        # nothing is evicted until the frame is drawn, so the budget may be
+        # exceeded by up to a screenful of chunks in between
+        onScreen: list[ImageTk.PhotoImage] = []
+        for cx in cxs:
+            for cy in cys:
+                entry = self._entry(cx, cy, evict=False)
+                if entry.imageSidelen != a:
+                    self._renderEntry(entry, a)
+                if entry.image is None:
+                    continue
+                x, y = minX + cx*C*a, minY + cy*C*a
+                if tkRenderer is None:
+                    renderer.image(x, y, entry.image)
+                else:
+                    photo = self._photo(entry, tkRenderer)
+                    onScreen.append(photo)
+                    tkRenderer.photo(x, y, photo)
+        self._onScreen = onScreen
+        self._evict()
+
+def main() -> None:
+    # usage: python chunked_grid.py MAP_IMAGE OUTPUT [CHUNK_SIDELEN]
+    if not 3 <= len(sys.argv) <= 4:
+        print(f"usage: {sys.argv[0]} MAP_IMAGE OUTPUT [CHUNK_SIDELEN]")
+        sys.exit(2)
+    chunkSidelen = int(sys.argv[3]) if len(sys.argv) == 4 else 64
+    convertMapImage(sys.argv[1], sys.argv[2], chunkSidelen)
+
+if __name__ == '__main__':
+    main()
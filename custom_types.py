@@ -5,6 +5,9 @@ R2 = tuple[float, float]
 R3 = tuple[float, float, float]
 P3 = R3
 R2Pair = tuple[R2, R2]
+SegPairHit = tuple[int, int, R2, float, float]
+# (i, j, point, position on segs[i], position on segs[j]), as reported by
+# `intersection.allIntersections`
 
 CoordMode = Literal["absolute", "relative", "display"]
 # to be used with a grid coordinate system;
@@ -12,3 +15,8 @@ CoordMode = Literal["absolute", "relative", "display"]
 # - relative: return relative coordinates, in case global coordinates are
 #   subject to floating point imprecision (reserved)
 # - display: return coordinate relative to camera? then we'll need a camera
+
+RenderMode = Literal["tiles", "chunks"]
+# how `grids.Grid.draw`/`render` puts blocks on the canvas;
+# - tiles: one canvas image per block
+# - chunks: one canvas image per prerendered chunk of blocks, cached per zoom
@@ -1,15 +1,17 @@
 from __future__ import annotations
 import dataclasses
-import time
 from cmu_112_graphics.cmu_112_graphics import App, TopLevelApp, WrappedCanvas
 from axis_aligned_box import AxisAlignedBox, AxisAlignedPlatform, AASystem
 from custom_types import R2
 from eventsync import ESync, KeyEventLike, MouseEventLike
+from renderer import TkRenderer, drawAASystem
+from simulator import Simulator
 
 
 @dataclasses.dataclass
 class AppData:
     aasys: AASystem
+    sim: Simulator
     prevTime: float
     mousePos: R2
     displayScale: float
@@ -17,9 +19,11 @@ class AppData:
 
 
 def appStarted(app: TopLevelApp) -> None:
+    aasys = AASystem([], [], (9.8*.5, -9.8*.75**.5))  # gravity is slanted
     data = AppData(
-        aasys=AASystem([], [], (9.8*.5, -9.8*.75**.5)),  # gravity is slanted
-        prevTime=time.perf_counter(),
+        aasys=aasys,
+        sim=Simulator(aasys, fixedDeltaTime=1/120, maxSubsteps=8),
+        prevTime=ESync.now(),
         mousePos=(0, 0),
         displayScale=32,  # 32 px == 1 m
     )
@@ -54,36 +58,19 @@ def keyPressed(app: App, event: KeyEventLike) -> None:
 @ESync.hook
 def timerFired(app: TopLevelApp) -> None:
     data: AppData = app.data  # type: ignore
-    currTime = time.perf_counter()
+    currTime = ESync.now()  # recorded time when replaying
     deltaTime = currTime - data.prevTime
 
-    data.aasys.step(deltaTime)
+    data.sim.advance(deltaTime)
 
     data.prevTime = currTime
 
 def redrawAll(app: TopLevelApp, canvas: WrappedCanvas) -> None:
     data: AppData = app.data  # type: ignore
-    W, H = app.width, app.height
-    DS = data.displayScale
-
-    for b in data.aasys.boxes:
-        rx, ry = b.position
-        sx, sy = b.size
-        rx_, ry_ = rx*DS + W/2, H/2 - ry*DS
-        sx_, sy_ = sx*DS, sy*DS
-        canvas.create_rectangle(
-            round(rx_ - sx_/2), round(ry_ - sy_/2),
-            round(rx_ + sx_/2), round(ry_ + sy_/2),
-            outline='#FF0000')
-
-    for p in data.aasys.platforms:
-        rx, ry = p.position
-        w = p.width
-        rx_, ry_ = rx*DS + W/2, H/2 - ry*DS
-        w_ = w*DS
-        canvas.create_line(
-            round(rx_ - w_/2), round(ry_),
-            round(rx_ + w_/2), round(ry_))
+    drawAASystem(
+        TkRenderer(app, canvas), data.aasys.boxes,
+        data.sim.interpolatedPositions(), data.aasys.platforms,
+        data.displayScale)
 
 
 if __name__ == '__main__':
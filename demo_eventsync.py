@@ -1,4 +1,5 @@
 from __future__ import annotations
+import dataclasses
 from cmu_112_graphics.cmu_112_graphics import TopLevelApp
 from eventsync import ESync
 from typing import TypeVar
@@ -8,6 +9,13 @@ _T = TypeVar('_T')
 def exposed_entries(d: dict[str, _T]) -> dict[str, _T]:
     return {k: v for k, v in d.items() if k and k[0].isalpha()}
 
+def event_entries(event: object) -> dict[str, object]:
+    # ESync hands wrapped listeners slotted dataclasses, which have no
+    # __dict__; Tk's own events (e.g. for mouseMoved) do
+    if dataclasses.is_dataclass(event):
+        return dataclasses.asdict(event)  # type: ignore
+    return exposed_entries(vars(event))
+
 def appStarted(app):
     print("appStarted", app)
 def appStopped(app):
@@ -18,27 +26,29 @@ def redrawAll(app, canvas):
 @ESync.key
 def keyPressed(app, event):
     print("keyPressed", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
+    print("event internals:", event_entries(event))
 @ESync.key
 def keyReleased(app, event):
     print("keyReleased", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
+    print("event internals:", event_entries(event))
 @ESync.mouse
 def mousePressed(app, event):
     print("mousePressed", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
+    print("event internals:", event_entries(event))
 @ESync.mouse
 def mouseReleased(app, event):
     print("mouseReleased", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
+    print("event internals:", event_entries(event))
 # @ESync.mouse  # unregistered for demonstration; should respond immediately
 def mouseMoved(app, event):
     print("mouseMoved", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
-@ESync.mouse  # registered, should respond with each call to timerFired
+    print("event internals:", event_entries(event))
+# registered, should respond with each call to timerFired, with only the last
+# drag position since the previous call
+@ESync.mouse(latest=True)
 def mouseDragged(app, event):
     print("mouseDragged", app, event)
-    print("event internals:", exposed_entries(event.__dict__))
+    print("event internals:", event_entries(event))
 @ESync.hook
 def timerFired(app):
     # print("timerFired", app)
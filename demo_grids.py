@@ -20,7 +20,7 @@ def appStarted(app: TopLevelApp) -> None:
 def redrawAll(app: TopLevelApp, canvas: WrappedCanvas) -> None:
     data: AppData = app.data  # type: ignore
     canvas.create_rectangle(0, 0, app.width, app.height, fill='#94CFE5')
-    data.grid.draw(app, canvas, 48, (384, 384))
+    data.grid.draw(app, canvas, 48, (384, 384), mode='chunks')
 
 
 if __name__ == '__main__':
@@ -4,7 +4,7 @@ import pygame
 import random
 import sys
 from custom_types import R2, R2Pair
-from intersection import pathSegCollision as psc
+from intersection import SegmentIndex
 from typing import Final
 
 
@@ -27,6 +27,7 @@ class App:
     rng: random.Random
 
     linesegs: list[R2Pair]
+    segindex: SegmentIndex
     pathstart: R2
     pathend: R2
 
@@ -46,6 +47,7 @@ class App:
         print(f"Number of line segments: {nsegs}")
 
         self.linesegs = []
+        self.segindex = SegmentIndex(cellSize=64)
         for _ in range(nsegs):
             self.add_random_seg()
 
@@ -67,6 +69,7 @@ class App:
         p1 = (cx - dx, cy - dy)
         p2 = (cx + dx, cy + dy)
         self.linesegs.append((p1, p2))
+        self.segindex.insert((p1, p2))
 
     def redraw(self) -> None:
         BLACK = (0,0,0,255)
@@ -97,8 +100,7 @@ class App:
     def recompute_intersecs(self) -> None:
         s = self.pathstart
         e = self.pathend
-        dists = [t for l in self.linesegs if (t:=psc((s, e), l)) is not None]
-        dists.sort()
+        dists = [t for t, _ in self.segindex.query_path((s, e))]
         self.intersecs = [interpolR2(s, e, d) for d in dists]
 
     def update(self) -> None:
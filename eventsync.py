@@ -1,9 +1,17 @@
 from __future__ import annotations
 import dataclasses
-from cmu_112_graphics.cmu_112_graphics import App
+import struct
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
 from functools import lru_cache, wraps
-from threading import Lock
-from typing import Any, Protocol, final
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Final, Protocol, final
+
+if TYPE_CHECKING:
+    # only for annotations, so that logs can be replayed without Tk
+    from cmu_112_graphics.cmu_112_graphics import App
+    from profiler import FrameProfiler
 
 
 class MouseEventLike(Protocol):
@@ -15,11 +23,13 @@ class KeyEventLike(Protocol):
 
 @dataclasses.dataclass
 class MouseEventMinimal:
+    __slots__ = ('x', 'y')  # one is made per event, so keep them small
     x: int
     y: int
 
 @dataclasses.dataclass
 class KeyEventMinimal:
+    __slots__ = ('key',)
     key: str
 
 
@@ -31,67 +41,209 @@ class SingularListenerLike(Protocol):
     def __call__(self, app: App) -> Any: ...
 
 
-@dataclasses.dataclass
-class _ESMouseDispatcher:
-    call: MouseListenerLike
-    app: App
-    event: MouseEventMinimal
-
-    def __call__(self) -> None:
-        self.call(self.app, self.event)
+# a queued event: (listener, app, event), with event None for singular ones
+_ESRecord = tuple[Callable, 'App', 'MouseEventMinimal | KeyEventMinimal | None']
 
-@dataclasses.dataclass
-class _ESKeyDispatcher:
-    call: KeyListenerLike
-    app: App
-    event: KeyEventMinimal
-
-    def __call__(self) -> None:
-        self.call(self.app, self.event)
-
-@dataclasses.dataclass
-class _ESSingularDispatcher:
-    call: SingularListenerLike
-    app: App
-
-    def __call__(self) -> None:
-        self.call(self.app)
-
-
-class _ESDispatcherLike(Protocol):
-    def __call__(self) -> None: ...
-class _DispatcherStorageLike(Protocol):
-    def __call__(self, ed: _ESDispatcherLike, /) -> None: ...
+class _RecordStorageLike(Protocol):
+    def __call__(self, record: _ESRecord, /) -> None: ...
 
 
 @dataclasses.dataclass
 class _ESMouseListener:
+    __slots__ = ('call', 'store')
     call: MouseListenerLike
-    store: _DispatcherStorageLike
+    store: _RecordStorageLike
 
     def __call__(self, app: App, event: MouseEventLike) -> None:
-        eventmin = MouseEventMinimal(event.x, event.y)
-        dispatcher = _ESMouseDispatcher(self.call, app, eventmin)
-        self.store(dispatcher)
+        self.store((self.call, app, MouseEventMinimal(event.x, event.y)))
 
 @dataclasses.dataclass
 class _ESKeyListener:
+    __slots__ = ('call', 'store')
     call: KeyListenerLike
-    store: _DispatcherStorageLike
+    store: _RecordStorageLike
 
     def __call__(self, app: App, event: KeyEventLike) -> None:
-        eventmin = KeyEventMinimal(event.key)
-        dispatcher = _ESKeyDispatcher(self.call, app, eventmin)
-        self.store(dispatcher)
+        self.store((self.call, app, KeyEventMinimal(event.key)))
 
 @dataclasses.dataclass
 class _ESSingularListener:
+    __slots__ = ('call', 'store')
     call: SingularListenerLike
-    store: _DispatcherStorageLike
+    store: _RecordStorageLike
 
     def __call__(self, app: App) -> None:
-        dispatcher = _ESSingularDispatcher(self.call, app)
-        self.store(dispatcher)
+        self.store((self.call, app, None))
+
+
+class _ESPolicyQueue:
+    '''
+    Event queue of one listener with a policy (see `ESync.mouse`). Stands in
+    for the shared queue's `append`: keeps the listener's events to itself,
+    and puts a single marker in the shared queue, where the events are taken
+    out when the marker is dispatched.
+    '''
+
+    __slots__ = ('records', 'budget', 'dropped', '_scheduled', '_store')
+
+    records: deque[_ESRecord]
+    budget: int | None  # events handed out per tick, or None for all
+    dropped: int        # events dropped because the queue was full
+    _scheduled: bool    # whether a marker is in the shared queue
+    _store: _RecordStorageLike
+
+    def __init__(
+            self,
+            store: _RecordStorageLike,
+            maxQueued: int | None,
+            budget: int | None,
+            ) -> None:
+        if maxQueued is not None and maxQueued < 1:
+            raise ValueError(f"maxQueued must be at least 1, got {maxQueued!r}")
+        if budget is not None and budget < 1:
+            raise ValueError(f"budget must be at least 1, got {budget!r}")
+        self.records = deque(maxlen=maxQueued)
+        self.budget = budget
+        self.dropped = 0
+        self._scheduled = False
+        self._store = store
+
+    def __call__(self, record: _ESRecord, /) -> None:
+        records = self.records
+        if len(records) == records.maxlen:
+            self.dropped += 1  # `append` pushes the oldest one out
+        records.append(record)
+        if not self._scheduled:
+            self._scheduled = True
+            self._store((self, None, None))
+
+    def take(self) -> list[_ESRecord]:
+        # this tick's share of the events; a new marker carries the rest over
+        # to the next tick
+        self._scheduled = False
+        records = self.records
+        n = len(records)
+        if self.budget is not None: n = min(n, self.budget)
+        taken = [records.popleft() for _ in range(n)]
+        if records and not self._scheduled:
+            self._scheduled = True
+            self._store((self, None, None))
+        return taken
+
+
+# Event log layout (all integers little-endian), as written by `ESync.record`:
+#
+#     header  magic b'ESYNCLG1', then f64 clock time when recording started
+#     records one after the other, each starting with a u8 record type:
+#             NAME      u16 ID, u16 length, UTF-8 string; defines a name used
+#                       by later records (listeners, hooks and keys)
+#             MOUSE     u16 listener name ID, i32 x, i32 y
+#             KEY       u16 listener name ID, u16 key name ID
+#             SINGULAR  u16 listener name ID
+#             TICK      u16 hook name ID, f64 clock time
+#
+# The events dispatched on a tick are logged right before its TICK record.
+# Listeners and hooks are named "module:qualname".
+
+ESYNC_LOG_MAGIC: Final = b'ESYNCLG1'
+_LOG_HEADER: Final = struct.Struct('<8sd')
+_REC_NAME: Final = struct.Struct('<BHH')
+_REC_MOUSE: Final = struct.Struct('<BHii')
+_REC_KEY: Final = struct.Struct('<BHH')
+_REC_SINGULAR: Final = struct.Struct('<BH')
+_REC_TICK: Final = struct.Struct('<BHd')
+_NAME, _MOUSE, _KEY, _SINGULAR, _TICK = range(1, 6)
+
+
+def _listenerName(call: Callable) -> str:
+    return f"{call.__module__}:{call.__qualname__}"
+
+
+class _ESRecorder:
+
+    file: BinaryIO
+    ticks: int
+    _ids: dict[str, int]
+
+    def __init__(self, file: BinaryIO, startTime: float) -> None:
+        self.file = file
+        self.ticks = 0
+        self._ids = {}
+        file.write(_LOG_HEADER.pack(ESYNC_LOG_MAGIC, startTime))
+
+    def _nameId(self, name: str) -> int:
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self._ids)
+            data = name.encode()
+            self.file.write(_REC_NAME.pack(_NAME, i, len(data)) + data)
+        return i
+
+    def batch(
+            self, hook: Callable, records: list[_ESRecord], clock: float,
+            ) -> None:
+        write, nameId = self.file.write, self._nameId
+        for call, _, event in records:
+            i = nameId(_listenerName(call))
+            if event is None:
+                write(_REC_SINGULAR.pack(_SINGULAR, i))
+            elif isinstance(event, MouseEventMinimal):
+                write(_REC_MOUSE.pack(_MOUSE, i, event.x, event.y))
+            else:
+                write(_REC_KEY.pack(_KEY, i, nameId(event.key)))
+        write(_REC_TICK.pack(_TICK, nameId(_listenerName(hook)), clock))
+        self.ticks += 1
+
+
+@dataclasses.dataclass
+class LoggedTick:
+    clock: float
+    hook: str
+    # (listener name, event), with event None for singular listeners
+    events: list[tuple[str, MouseEventMinimal | KeyEventMinimal | None]]
+
+
+def readEventLog(file: BinaryIO) -> tuple[float, Iterator[LoggedTick]]:
+    # the start time of an event log written by `ESync.record`, and its ticks
+    header = file.read(_LOG_HEADER.size)
+    if len(header) < _LOG_HEADER.size:
+        raise ValueError("not an ESync event log")
+    magic, startTime = _LOG_HEADER.unpack(header)
+    if magic != ESYNC_LOG_MAGIC:
+        raise ValueError("not an ESync event log")
+
+    def ticks() -> Iterator[LoggedTick]:
+        names: list[str] = []
+        events: list[tuple[str, MouseEventMinimal | KeyEventMinimal | None]]
+        events = []
+        def read(rec: struct.Struct) -> tuple[Any, ...]:
+            data = file.read(rec.size - 1)
+            if len(data) < rec.size - 1:
+                raise ValueError("truncated ESync event log")
+            return rec.unpack(b'\0' + data)[1:]
+        while kind := file.read(1):
+            if kind[0] == _NAME:
+                i, n = read(_REC_NAME)
+                if i != len(names):
+                    raise ValueError(f"out-of-order name {i} in ESync log")
+                names.append(file.read(n).decode())
+            elif kind[0] == _MOUSE:
+                i, x, y = read(_REC_MOUSE)
+                events.append((names[i], MouseEventMinimal(x, y)))
+            elif kind[0] == _KEY:
+                i, k = read(_REC_KEY)
+                events.append((names[i], KeyEventMinimal(names[k])))
+            elif kind[0] == _SINGULAR:
+                i, = read(_REC_SINGULAR)
+                events.append((names[i], None))
+            elif kind[0] == _TICK:
+                i, clock = read(_REC_TICK)
+                yield LoggedTick(clock, names[i], events)
+                events = []
+            else:
+                raise ValueError(f"unknown ESync log record type {kind[0]}")
+
+    return startTime, ticks()
 
 
 @lru_cache(1)  # is singleton (takes no arguments, so fine)
@@ -121,6 +273,10 @@ class _EventSyncronizer:
         def sizeChanged(app):
             ...  # do stuff as normal
 
+        @ESync.mouse(latest=True)  # only the last position matters
+        def mouseMoved(app, event):
+            ...  # do stuff as normal
+
         @ESync.hook  # this one for `timerFired` in particular
         def timerFired(app):
             ...  # do stuff as normal
@@ -135,51 +291,159 @@ class _EventSyncronizer:
 
         .hook should NOT be used on `redrawAll` because it will cause MVC
         violations.
+
+    Recording and replay:
+
+        ESync.record('session.eslog')  # e.g. in appStarted
+        ...
+        ESync.stopRecording()          # e.g. in appStopped
+
+        # later, without Tk, as fast as possible; `record` does nothing
+        # while replaying, so `appStarted` can be the setup as is
+        ESync.replay('session.eslog', app, setup=appStarted)
+
+        Every batch of events is logged with the tick it was dispatched on,
+        and `replay` feeds them to the same listeners and hooks, in the same
+        order. Hooks that need the time should read `ESync.now()` rather
+        than the wall clock, so that replays see the recorded times.
     '''
 
-    container: list[_ESDispatcherLike]
-    containerlock: Lock
+    # appended to by the listeners, drained by the hook; deque appends and
+    # pops are atomic, so this takes no lock
+    container: deque[_ESRecord]
+    listeners: dict[str, Callable]  # decorated functions, by "module:qualname"
+    recorder: _ESRecorder | None
+    profiler: FrameProfiler | None  # set by `FrameProfiler.enable`
+    _policyQueues: list[_ESPolicyQueue]  # of listeners with policies
+    _clock: float | None  # time of the current tick, see `now`
+    _replaying: bool
 
     def __init__(self) -> None:
-        self.container = []
-        self.containerlock = Lock()
-
-    def _dispatch(self) -> None:
-        self.containerlock.acquire()
-        container = self.container.copy()  # shallow
-        self.container.clear()
-        self.containerlock.release()
-        for d in container: d()
-
-    def _store(self, esdl: _ESDispatcherLike) -> None:
-        self.containerlock.acquire()
-        self.container.append(esdl)
-        self.containerlock.release()
-
-    def mouse(self, call: MouseListenerLike) -> _ESMouseListener:
+        self.container = deque()
+        self.listeners = {}
+        self.recorder = None
+        self.profiler = None
+        self._clock = None
+        self._replaying = False
+        self._policyQueues = []
+
+    def _dispatch(self, hook: Callable | None = None) -> int:
+        # takes only what was queued so far; events queued meanwhile by other
+        # threads wait for the next tick; returns how many were dispatched
+        popleft = self.container.popleft
+        records: list[_ESRecord] = []
+        for _ in range(len(self.container)):
+            record = popleft()
+            if type(record[0]) is _ESPolicyQueue:
+                records.extend(record[0].take())
+            else:
+                records.append(record)
+        if hook is not None:
+            self._clock = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.batch(hook, records, self._clock)
+        for call, app, event in records:
+            if event is None:
+                call(app)
+            else:
+                call(app, event)
+        return len(records)
+
+    def _store(
+            self,
+            call: Callable,
+            latest: bool,
+            maxQueued: int | None,
+            budget: int | None,
+            ) -> _RecordStorageLike:
+        # where a listener with the given policy puts its events
+        self.listeners[_listenerName(call)] = call
+        if latest:
+            maxQueued = 1
+        if maxQueued is None and budget is None:
+            return self.container.append
+        queue = _ESPolicyQueue(self.container.append, maxQueued, budget)
+        self._policyQueues.append(queue)
+        return queue
+
+    def queueDepth(self) -> int:
+        # events waiting for the next tick; listeners with policies keep
+        # theirs to themselves, behind one marker in the shared queue
+        depth = len(self.container)
+        for queue in self._policyQueues:
+            depth += len(queue.records) - queue._scheduled
+        return depth
+
+    def mouse(
+            self,
+            call: MouseListenerLike | None = None,
+            /, *,
+            latest: bool = False,
+            maxQueued: int | None = None,
+            budget: int | None = None,
+            ) -> Any:
         '''
         Wrap a mouse event listener, to eliminate race conditions while
         leveraging the listener paradigm.
-        '''
-        return _ESMouseListener(call, self._store)
 
-    def key(self, call: KeyListenerLike) -> _ESKeyListener:
+        Used bare (`@ESync.mouse`), every event is delivered. Used with
+        arguments, the listener gets its own queue with a policy:
+
+            latest     only the newest event is delivered each tick, e.g.
+                       for `mouseMoved`; same as maxQueued=1
+            maxQueued  at most this many events are kept, dropping the
+                       oldest ones
+            budget     at most this many events are delivered each tick;
+                       the rest wait for the next ticks
+
+        e.g. `@ESync.mouse(latest=True)`. Each listener's `.store.dropped`
+        counts the events its policy dropped.
+        '''
+        if call is None:
+            return lambda call: self.mouse(
+                call, latest=latest, maxQueued=maxQueued, budget=budget)
+        return _ESMouseListener(
+            call, self._store(call, latest, maxQueued, budget))
+
+    def key(
+            self,
+            call: KeyListenerLike | None = None,
+            /, *,
+            latest: bool = False,
+            maxQueued: int | None = None,
+            budget: int | None = None,
+            ) -> Any:
         '''
         Wrap a key event listener, to eliminate race conditions while leveraging
-        the listener paradigm.
+        the listener paradigm. Takes the same policies as `.mouse`.
         '''
-        return _ESKeyListener(call, self._store)
-
-    def singular(self, call: SingularListenerLike) -> _ESSingularListener:
+        if call is None:
+            return lambda call: self.key(
+                call, latest=latest, maxQueued=maxQueued, budget=budget)
+        return _ESKeyListener(
+            call, self._store(call, latest, maxQueued, budget))
+
+    def singular(
+            self,
+            call: SingularListenerLike | None = None,
+            /, *,
+            latest: bool = False,
+            maxQueued: int | None = None,
+            budget: int | None = None,
+            ) -> Any:
         '''
         Wrap a singular event listener, to eliminate race conditions while
-        leveraging the listener paradigm.
+        leveraging the listener paradigm. Takes the same policies as `.mouse`.
 
         A "singular" event listener is one that takes only `app` as argument.
         This decorator should NOT be used on `appStarted` or `appStopped`
         because those functions may run without the main loop being active.
         '''
-        return _ESSingularListener(call, self._store)
+        if call is None:
+            return lambda call: self.singular(
+                call, latest=latest, maxQueued=maxQueued, budget=budget)
+        return _ESSingularListener(
+            call, self._store(call, latest, maxQueued, budget))
 
     def hook(self, call):
         '''
@@ -190,11 +454,106 @@ class _EventSyncronizer:
         .hook should NOT be used on `redrawAll` because it will cause MVC
         violations.
         '''
+        self.listeners[_listenerName(call)] = call
         @wraps(call)
         def __inner(*a, **kw):
-            self._dispatch()
+            if self.profiler is not None:
+                return self.profiler.tick(self, call, *a, **kw)
+            self._dispatch(call)
             call(*a, **kw)
         return __inner
 
+    def now(self) -> float:
+        '''
+        Clock time in seconds (`time.perf_counter`) of the current tick, i.e.
+        as of the last hooked call or the start of recording; the recorded
+        time while replaying. Before the first tick, the time right now.
+        '''
+        if self._clock is not None:
+            return self._clock
+        return time.perf_counter()
+
+    def record(self, path: Path | str) -> None:
+        '''
+        Start logging every dispatched batch of events, with its tick, to the
+        file at `path` (see `readEventLog` for the format). Does nothing while
+        replaying, which would otherwise overwrite the log being replayed.
+        '''
+        if self._replaying:
+            return
+        self.stopRecording()
+        self._clock = time.perf_counter()
+        self.recorder = _ESRecorder(open(path, 'wb'), self._clock)
+
+    def stopRecording(self) -> None:
+        if self.recorder is not None:
+            self.recorder.file.close()
+            self.recorder = None
+
+    def _resolve(
+            self, name: str, listeners: dict[str, Callable]) -> Callable:
+        # looks a logged name up; a log recorded from a script run directly
+        # names its listeners "__main__:...", which also match by qualname
+        call = listeners.get(name)
+        if call is None:
+            module, _, qualname = name.partition(':')
+            matches = [
+                c for n, c in listeners.items()
+                if module == '__main__' and n.partition(':')[2] == qualname]
+            if len(matches) != 1:
+                raise KeyError(f"no unique listener or hook for {name!r}")
+            call = matches[0]
+        return call
+
+    def replay(
+            self,
+            path: Path | str,
+            app: Any,
+            setup: SingularListenerLike | None = None,
+            listeners: dict[str, Callable] | None = None,
+            ) -> int:
+        '''
+        Feed an event log written by `record` through the listeners and hooks
+        it names, tick by tick and without waiting in between; `app` can be
+        any stand-in object the listeners accept. `setup` (e.g. `appStarted`)
+        is called first, at the recorded start time. Listeners are looked up
+        in `listeners`, which defaults to every function decorated so far.
+        Recording is paused for the duration. Returns the number of ticks
+        replayed.
+        '''
+        if self._replaying:
+            raise RuntimeError("replay is already running")
+        listeners = self.listeners if listeners is None else listeners
+        resolved: dict[str, Callable] = {}
+        ticks = 0
+        liveClock, liveRecorder = self._clock, self.recorder
+        with open(path, 'rb') as f:
+            startTime, log = readEventLog(f)
+            try:
+                self.recorder, self._replaying = None, True
+                self._clock = startTime
+                if setup is not None: setup(app)
+                for tick in log:
+                    self._clock = tick.clock
+                    for name, event in tick.events:
+                        call = resolved.get(name)
+                        if call is None:
+                            call = resolved[name] = (
+                                self._resolve(name, listeners))
+                        if event is None:
+                            call(app)
+                        else:
+                            call(app, event)
+                    call = resolved.get(tick.hook)
+                    if call is None:
+                        call = resolved[tick.hook] = (
+                            self._resolve(tick.hook, listeners))
+                    call(app)
+                    ticks += 1
+            finally:
+                self._clock = liveClock
+                self.recorder, self._replaying = liveRecorder, False
+        return ticks
+
 
 ESync = _EventSyncronizer()  # singleton object
@@ -0,0 +1,277 @@
+from __future__ import annotations
+import dataclasses
+import math
+import numpy as np
+from axis_aligned_box import AxisAlignedPlatform
+from blocks import blockRegistry
+from custom_types import R2, R2Pair
+from gridmap import GridMap
+from typing import Final
+
+_EPS: Final = 1E-9  # in cells; boxes resting on a block stay on it
+
+
+class GridCollider:
+    '''
+    Collision queries against the solid blocks (see `BlockSpec.solid`) of a
+    `GridMap`, for the physics in axis_aligned_box.py.
+
+    Block (ix, iy) covers the world square
+
+        [ox + ix*s, ox + (ix+1)*s] x [oy + (h-1-iy)*s, oy + (h-iy)*s]
+
+    where (ox, oy) is `origin`, s is `cellSize` and h is the map height: the
+    bottom-left corner of the map sits at `origin` and y points up, as when
+    the map is drawn with `Grid.draw`. Solidity is read from the map on every
+    query, so edits to the map take effect right away.
+
+    `sweepBox` treats every horizontal edge between a solid and a non-solid
+    block like an `AxisAlignedPlatform`, and walks the box's leading edge row
+    by row (Amanatides-Woo traversal along y), so its cost grows with the
+    cells the box sweeps over rather than with the number of solid blocks.
+    '''
+
+    grid: GridMap
+    cellSize: float
+    origin: R2
+    cellsTested: int  # cells looked at by `sweepBox` so far
+
+    def __init__(
+            self, grid: GridMap, cellSize: float = 1.0, origin: R2 = (0, 0),
+            ) -> None:
+        self.grid = grid
+        self.cellSize = cellSize
+        self.origin = origin
+        self.cellsTested = 0
+
+    def cellAt(self, point: R2) -> tuple[int, int]:
+        # (ix, iy) of the block containing `point`; may be outside the map
+        x, y = point
+        ox, oy = self.origin
+        s = self.cellSize
+        _, h = self.grid.size
+        return math.floor((x - ox) / s), h - 1 - math.floor((y - oy) / s)
+
+    def corner(self, ix: int, iy: int) -> R2:
+        # world position of the top-left corner of block (ix, iy), i.e. of
+        # where grid lines x = ix and y = iy cross; ix and iy may be w and h
+        ox, oy = self.origin
+        s = self.cellSize
+        _, h = self.grid.size
+        return ox + ix*s, oy + (h - iy)*s
+
+    def cellBounds(self, ix: int, iy: int) -> tuple[R2, R2]:
+        # min and max corners of block (ix, iy) in the world
+        (x0, y1), (x1, y0) = self.corner(ix, iy), self.corner(ix + 1, iy + 1)
+        return (x0, y0), (x1, y1)
+
+    def isSolid(self, ix: int, iy: int) -> bool:
+        w, h = self.grid.size
+        if not (0 <= ix < w and 0 <= iy < h):
+            return False
+        return bool(blockRegistry().solid[self.grid.blockIds[ix, iy]])
+
+    def solidMask(self, ix0: int, iy0: int, ix1: int, iy1: int) -> np.ndarray:
+        # solidity of the blocks in [ix0, ix1) x [iy0, iy1) as a boolean array
+        # indexed [ix - ix0, iy - iy0]; blocks outside the map are not solid
+        w, h = self.grid.size
+        mask = np.zeros((ix1 - ix0, iy1 - iy0), dtype=bool)
+        cx0, cy0 = max(ix0, 0), max(iy0, 0)
+        cx1, cy1 = min(ix1, w), min(iy1, h)
+        if cx0 < cx1 and cy0 < cy1:
+            ids = self.grid.blockIds[cx0:cx1, cy0:cy1]
+            mask[cx0 - ix0:cx1 - ix0, cy0 - iy0:cy1 - iy0] = (
+                blockRegistry().solid[ids])
+        return mask
+
+    def _solidRow(self, i0: int, i1: int, j: int) -> np.ndarray:
+        # solidity of blocks i0 <= ix < i1 in row j, counted from the bottom
+        # of the map (iy = h-1-j)
+        _, h = self.grid.size
+        return self.solidMask(i0, h - 1 - j, i1, h - j)[:, 0]
+
+    def sweepBox(self, lo: R2, hi: R2, delta: R2) -> float | None:
+        # the box with min and max corners `lo` and `hi` moves by `delta`;
+        # returns how far along `delta` (0 to 1) it first crosses a solid
+        # block's top edge going down, or bottom edge going up, or None
+        dx, dy = delta
+        if dy == 0:
+            return None
+        ox, oy = self.origin
+        s = self.cellSize
+        _, h = self.grid.size
+        x0, x1 = (lo[0] - ox) / s, (hi[0] - ox) / s
+        ddx = dx / s
+
+        # grid lines y = k (in cells) are crossed by the leading edge at
+        # t = (k - u0) / du, one row at a time
+        if dy < 0:
+            u0, du, step = (lo[1] - oy) / s, dy / s, -1
+            k = min(math.floor(u0 + _EPS), h)
+        else:
+            u0, du, step = (hi[1] - oy) / s, dy / s, 1
+            k = max(math.ceil(u0 - _EPS), 0)
+
+        while 0 <= k <= h:
+            t = max(0.0, (k - u0) / du)
+            if t > 1:
+                break
+            # row entered and row left when crossing line k
+            jIn, jOut = (k - 1, k) if step < 0 else (k, k - 1)
+            i0 = math.floor(x0 + ddx*t + _EPS)
+            i1 = math.ceil(x1 + ddx*t - _EPS)
+            if i1 > i0:
+                self.cellsTested += i1 - i0
+                entered = self._solidRow(i0, i1, jIn)
+                if (entered & ~self._solidRow(i0, i1, jOut)).any():
+                    return t
+            k += step
+        return None
+
+
+BlockRect = tuple[int, int, int, int]  # [ix0, ix1) x [iy0, iy1), in blocks
+BlockEdge = tuple[int, int, int]       # line, and [start, stop) along it
+
+
+def _runs(line: np.ndarray) -> list[tuple[int, int]]:
+    # [start, stop) of every run of True in a 1D boolean array
+    edges = np.flatnonzero(np.diff(line, prepend=False, append=False))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+def greedyRects(mask: np.ndarray) -> list[BlockRect]:
+    # covers the True cells of a (w, h) boolean array, indexed [ix, iy], with
+    # few rectangles: each one is grown as far as it goes along x, then
+    # along y
+    todo = mask.copy()
+    w, h = todo.shape
+    rects: list[BlockRect] = []
+    for iy in range(h):
+        for ix0, ix1 in _runs(todo[:, iy]):
+            iy1 = iy + 1
+            while iy1 < h and todo[ix0:ix1, iy1].all():
+                iy1 += 1
+            todo[ix0:ix1, iy:iy1] = False
+            rects.append((ix0, iy, ix1, iy1))
+    return rects
+
+
+@dataclasses.dataclass
+class _ChunkMesh:
+    rects: list[BlockRect]
+    hEdges: list[BlockEdge]  # along grid lines y = iy
+    vEdges: list[BlockEdge]  # along grid lines x = ix
+
+
+class GridMesh:
+    '''
+    Explicit colliders for the solid blocks of the map behind a
+    `GridCollider`, with adjacent blocks merged: solid regions as a few
+    rectangles (`rects`), and their outlines as maximal straight edges
+    (`segments`, or `platforms` for the horizontal ones, for `AASystem`).
+
+    The map is meshed chunk by chunk (`chunkSidelen` blocks per side), and
+    merging stops at chunk borders. The mesh listens to the map's writes and
+    only re-meshes the chunks they touch, on the next read or `update`.
+    '''
+
+    collider: GridCollider
+    chunkSidelen: int
+    regenerations: int  # chunks meshed so far
+
+    _chunks: dict[tuple[int, int], _ChunkMesh]
+    _dirty: set[tuple[int, int]]
+
+    def __init__(self, collider: GridCollider, chunkSidelen: int = 64) -> None:
+        self.collider = collider
+        self.chunkSidelen = chunkSidelen
+        self.regenerations = 0
+        self._chunks = {}
+        w, h = collider.grid.size
+        C = chunkSidelen
+        self._dirty = {
+            (cx, cy) for cx in range(-(-w // C)) for cy in range(-(-h // C))}
+        collider.grid.changeListeners.append(self._changed)
+
+    def close(self) -> None:
+        # stops following the map
+        self.collider.grid.changeListeners.remove(self._changed)
+
+    def _changed(self, ix0: int, iy0: int, ix1: int, iy1: int) -> None:
+        # a chunk owns the lines along its top and left sides, which also
+        # depend on the blocks just before it; hence the extra row and column,
+        # up to the edge of the map (writes are checked to lie in it)
+        C = self.chunkSidelen
+        w, h = self.collider.grid.size
+        ix1, iy1 = min(ix1 + 1, w), min(iy1 + 1, h)
+        for cx in range(ix0 // C, -(-ix1 // C)):
+            for cy in range(iy0 // C, -(-iy1 // C)):
+                self._dirty.add((cx, cy))
+
+    def _meshChunk(self, cx: int, cy: int) -> _ChunkMesh:
+        C = self.chunkSidelen
+        w, h = self.collider.grid.size
+        x0, y0 = cx*C, cy*C
+        x1, y1 = min(x0 + C, w), min(y0 + C, h)
+        # lines x = x0 .. x1 - 1 and y = y0 .. y1 - 1 belong to this chunk,
+        # plus x = w and y = h at the right and bottom of the map
+        lx1 = x1 + 1 if x1 == w else x1
+        ly1 = y1 + 1 if y1 == h else y1
+        mask = self.collider.solidMask(x0 - 1, y0 - 1, lx1, ly1)
+        inner = mask[1:x1 - x0 + 1, 1:y1 - y0 + 1]
+        # exposed where the blocks on either side of a line differ
+        hExposed = mask[1:x1 - x0 + 1, :-1] != mask[1:x1 - x0 + 1, 1:]
+        vExposed = mask[:-1, 1:y1 - y0 + 1] != mask[1:, 1:y1 - y0 + 1]
+        self.regenerations += 1
+        return _ChunkMesh(
+            [(x0 + a, y0 + b, x0 + c, y0 + d)
+             for a, b, c, d in greedyRects(inner)],
+            [(y0 + k, x0 + a, x0 + b)
+             for k in range(hExposed.shape[1])
+             for a, b in _runs(hExposed[:, k])],
+            [(x0 + k, y0 + a, y0 + b)
+             for k in range(vExposed.shape[0])
+             for a, b in _runs(vExposed[k, :])])
+
+    def update(self) -> set[tuple[int, int]]:
+        # re-meshes the chunks changed since the last update; returns them
+        dirty, self._dirty = self._dirty, set()
+        for cx, cy in dirty:
+            self._chunks[cx, cy] = self._meshChunk(cx, cy)
+        return dirty
+
+    def blockRects(self) -> list[BlockRect]:
+        self.update()
+        return [r for m in self._chunks.values() for r in m.rects]
+
+    def rects(self) -> list[tuple[R2, R2]]:
+        # min and max corners of every rectangle, in the world
+        corner = self.collider.corner
+        rects: list[tuple[R2, R2]] = []
+        for ix0, iy0, ix1, iy1 in self.blockRects():
+            (x0, y1), (x1, y0) = corner(ix0, iy0), corner(ix1, iy1)
+            rects.append(((x0, y0), (x1, y1)))
+        return rects
+
+    def horizontalSegments(self) -> list[R2Pair]:
+        self.update()
+        corner = self.collider.corner
+        return [
+            (corner(a, k), corner(b, k))
+            for m in self._chunks.values() for k, a, b in m.hEdges]
+
+    def verticalSegments(self) -> list[R2Pair]:
+        self.update()
+        corner = self.collider.corner
+        return [
+            (corner(k, b), corner(k, a))
+            for m in self._chunks.values() for k, a, b in m.vEdges]
+
+    def segments(self) -> list[R2Pair]:
+        # the outline of every solid region, e.g. for intersection.py
+        return self.horizontalSegments() + self.verticalSegments()
+
+    def platforms(self) -> list[AxisAlignedPlatform]:
+        # the horizontal part of the outlines, as platforms for `AASystem`
+        return [
+            AxisAlignedPlatform(((x0 + x1)/2, y), x1 - x0)
+            for (x0, y), (x1, _) in self.horizontalSegments()]
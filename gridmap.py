@@ -0,0 +1,168 @@
+from __future__ import annotations
+import numpy as np
+from PIL import Image
+from blocks import blockRegistry
+from collections.abc import Callable
+from typing import Final
+from util import MAPDIR
+
+# Grid maps without Tk: decoding map images and storing/querying blocks.
+# `grids.Grid` adds drawing on top.
+
+
+CHUNK_SIDELEN: Final = 16  # blocks per chunk side, for chunked rendering
+
+
+class MapLegendError(ValueError):
+    '''
+    Raised when a map image has pixels whose colors are not the map legend of
+    any block kind; `unknown` maps each such color to its (x, y) positions.
+    '''
+
+    unknown: dict[tuple[int, int, int], list[tuple[int, int]]]
+
+    def __init__(
+            self,
+            unknown: dict[tuple[int, int, int], list[tuple[int, int]]],
+            ) -> None:
+        self.unknown = unknown
+        lines = [f"{len(unknown)} unknown map legend color(s):"]
+        for color, coords in unknown.items():
+            shown = ', '.join(map(str, coords[:10]))
+            if len(coords) > 10:
+                shown += f", ... ({len(coords) - 10} more)"
+            lines.append(f"  {color} at {shown}")
+        super().__init__('\n'.join(lines))
+
+
+def decodeMapImage(mapImg: Image.Image) -> np.ndarray:
+    # turns a map image into a (w, h) array of block IDs, indexed [ix, iy],
+    # by looking every pixel's color up in the map legends of the block kinds
+    reg = blockRegistry()
+    keys = reg.legendKeys
+    rgb = np.asarray(mapImg.convert(mode='RGB'), dtype=np.uint32)  # (h, w, 3)
+    packed = rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2]
+    idx = np.searchsorted(keys, packed)
+    idx[idx == len(keys)] = 0
+    known = keys[idx] == packed
+    if not known.all():
+        unknown: dict[tuple[int, int, int], list[tuple[int, int]]] = {}
+        for y, x in np.argwhere(~known).tolist():
+            unknown.setdefault(tuple(rgb[y, x].tolist()), []).append((x, y))
+        raise MapLegendError(unknown)
+    return np.ascontiguousarray(reg.legendIds[idx].T)
+
+
+def visibleRange(start: int, step: int, count: int, extent: int) -> range:
+    # indices i in range(count) whose span [start + i*step, start + (i+1)*step)
+    # overlaps the window span [0, extent)
+    first = -start // step
+    stop = -(-(extent - start) // step)  # ceiling division
+    return range(max(0, first), min(count, stop))
+
+
+def composeBlocks(blockIds: np.ndarray, a: int) -> Image.Image | None:
+    # composes a (w, h) array of block IDs into one image at `a` px/block;
+    # None if none of the blocks has a texture
+    table = blockRegistry().table
+    w, h = blockIds.shape
+    img = Image.new('RGBA', (w*a, h*a), (0, 0, 0, 0))
+    empty = True
+    for i, col in enumerate(blockIds.tolist()):
+        for j, blockId in enumerate(col):
+            txr = table[blockId].scaled_texture(a)
+            if txr is not None:
+                img.paste(txr, (i*a, j*a))
+                empty = False
+    return None if empty else img
+
+
+class GridMap:
+
+    size: tuple[int, int]
+    blockIds: np.ndarray  # (w, h) array of block IDs, indexed [ix, iy]
+    # called with (ix0, iy0, ix1, iy1) after blocks in [ix0, ix1) x [iy0, iy1)
+    # were written, e.g. by derived data that has to follow the map
+    changeListeners: list[Callable[[int, int, int, int], None]]
+
+    def __init__(self, mapName: str) -> None:
+        with Image.open(MAPDIR/mapName) as mapImg:
+            self._initBlocks(decodeMapImage(mapImg))
+
+    @classmethod
+    def fromImage(cls, mapImg: Image.Image) -> GridMap:
+        # like `cls(mapName)`, but for a map image that is already loaded
+        grid = cls.__new__(cls)
+        grid._initBlocks(decodeMapImage(mapImg))
+        return grid
+
+    def _initBlocks(self, blockIds: np.ndarray) -> None:
+        w, h = blockIds.shape
+        self.size = w, h
+        self.blockIds = blockIds
+        self.changeListeners = []
+
+    def _changed(self, ix0: int, iy0: int, ix1: int, iy1: int) -> None:
+        # called after the blocks in [ix0, ix1) x [iy0, iy1) were written
+        for listener in self.changeListeners:
+            listener(ix0, iy0, ix1, iy1)
+
+    def _checkRect(self, ix0: int, iy0: int, ix1: int, iy1: int) -> None:
+        # writes must lie in the map: NumPy would wrap negative indices and
+        # clip slices, and `_changed` would be told the wrong blocks
+        w, h = self.size
+        if not (0 <= ix0 <= ix1 <= w and 0 <= iy0 <= iy1 <= h):
+            raise IndexError(
+                f"blocks [{ix0}, {ix1}) x [{iy0}, {iy1}) out of the "
+                f"{w}x{h} map")
+
+    # writes should go through `setBlock`/`setRegion` rather than to
+    # `blockIds` directly, so that subclasses and listeners can keep up with
+    # changes
+
+    def getBlock(self, ix: int, iy: int) -> str:
+        return blockRegistry().names[self.blockIds[ix, iy]]
+
+    def setBlock(self, ix: int, iy: int, blockKind: str) -> None:
+        self._checkRect(ix, iy, ix + 1, iy + 1)
+        self.blockIds[ix, iy] = blockRegistry().ids[blockKind]
+        self._changed(ix, iy, ix + 1, iy + 1)
+
+    def getRegion(self, ix0: int, iy0: int, ix1: int, iy1: int) -> np.ndarray:
+        # read-only view of the block IDs in [ix0, ix1) x [iy0, iy1)
+        view = self.blockIds[ix0:ix1, iy0:iy1]
+        view.flags.writeable = False
+        return view
+
+    def setRegion(self, ix0: int, iy0: int, blockIds: np.ndarray) -> None:
+        # writes a 2D array of block IDs with its corner at (ix0, iy0)
+        ids = np.asarray(blockIds)
+        if ids.size and ids.max() >= len(blockRegistry().names):
+            raise ValueError(f"unknown block ID {ids.max()}")
+        rw, rh = ids.shape
+        self._checkRect(ix0, iy0, ix0 + rw, iy0 + rh)
+        self.blockIds[ix0:ix0 + rw, iy0:iy0 + rh] = ids
+        self._changed(ix0, iy0, ix0 + rw, iy0 + rh)
+
+    def fillRegion(
+            self, ix0: int, iy0: int, ix1: int, iy1: int, blockKind: str
+            ) -> None:
+        self._checkRect(ix0, iy0, ix1, iy1)
+        self.blockIds[ix0:ix1, iy0:iy1] = blockRegistry().ids[blockKind]
+        self._changed(ix0, iy0, ix1, iy1)
+
+    def cellsOfKind(
+            self,
+            blockKind: str,
+            rect: tuple[int, int, int, int] | None = None,
+            ) -> np.ndarray:
+        # (n, 2) array of the (ix, iy) of every `blockKind` block, optionally
+        # only those in rect = (ix0, iy0, ix1, iy1), meaning
+        # [ix0, ix1) x [iy0, iy1)
+        ix0, iy0 = 0, 0
+        ids = self.blockIds
+        if rect is not None:
+            ix0, iy0, ix1, iy1 = rect
+            ix0, iy0 = max(ix0, 0), max(iy0, 0)
+            ids = ids[ix0:ix1, iy0:iy1]
+        return np.argwhere(ids == blockRegistry().ids[blockKind]) + (ix0, iy0)
@@ -1,77 +1,141 @@
 from __future__ import annotations
-import json
-import tkinter as tk
-from PIL import Image, ImageTk
-from cmu_112_graphics.cmu_112_graphics import TopLevelApp, WrappedCanvas
-from custom_types import R2
-from functools import cache
-from typing import Any, Final
-from util import RCSDIR, TXRDIR, MAPDIR
-
-
-class BlockSpec:
-
-    texture: Image.Image | None
-    mapLegend: tuple[int, int, int]
-
-    def __init__(self, data) -> None:
-        ver = data['blockspec_version']
-        if ver == 1:
-            self.__init_specver_1(data)
-        else:
-            raise ValueError(f"blockspec_version {ver!r} is not recognized")
-
-    def __init_specver_1(self, data) -> None:
-        txrName = data['texture']
-        if txrName is None:
-            self.texture = None
-        else:
-            self.texture = Image.open(TXRDIR/txrName)
-        self.mapLegend = tuple(data['map_legend'])  # type: ignore
-
-    @cache
-    def scaled_texture(self, sidelen: int) -> Image | None:
-        if self.texture is None:
-            return None
-        else:
-            w, h = self.texture.size
-            resample: Any
-            if sidelen % w == 0 and sidelen % h == 0:
-                # integer up-scaling
-                resample = Image.Resampling.NEAREST
-            elif sidelen < (w*h)**.5:
-                # down-scaling
-                resample = Image.Resampling.BOX
+import dataclasses
+import numpy as np
+from PIL import Image
+from blocks import (
+    TEXTURE_CACHE as TEXTURE_CACHE,
+    BlockRegistry as BlockRegistry,
+    BlockSpec as BlockSpec,
+    blockAtlas as blockAtlas,
+    blockRegistry,
+    quantizeZoom,
+)
+from custom_types import R2, RenderMode
+from gridmap import (
+    CHUNK_SIDELEN,
+    GridMap,
+    MapLegendError as MapLegendError,
+    composeBlocks as composeBlocks,
+    decodeMapImage as decodeMapImage,
+    visibleRange,
+)
+from renderer import PhotoRenderer, Renderer, TkRenderer
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from PIL import ImageTk
+    from cmu_112_graphics.cmu_112_graphics import TopLevelApp, WrappedCanvas
+
+# `from <path> import <mod> as <mod>` re-exports for type checkers (see
+# cmu_112_graphics/__init__.py); the BLOCK_* names are looked up lazily
+
+
+def __getattr__(name: str) -> Any:
+    import blocks
+    return getattr(blocks, name)
+
+
+@dataclasses.dataclass
+class _ChunkImage:
+    blockIds: np.ndarray  # copy of the blocks `image` was last drawn from
+    image: Image.Image | None
+    photo: ImageTk.PhotoImage | None = None  # made when first drawn with Tk
+
+
+class Grid(GridMap):
+    '''
+    A grid map drawn with a `renderer.Renderer` (`render`) or straight onto
+    a Tk canvas (`draw`), either block by block (`mode='tiles'`) or as
+    prerendered chunks of `CHUNK_SIDELEN` blocks (`mode='chunks'`).
+
+    Chunk images are kept across frames. Writes through `setBlock`,
+    `setRegion` and `fillRegion` only mark the chunks they touch as dirty,
+    and the next `draw` repaints just the blocks of those chunks that differ
+    from what was drawn, in place; frames where nothing changed render
+    nothing. `renders` and `patches` count full chunk renders and in-place
+    repaints.
+    '''
+
+    renders: int
+    patches: int
+
+    # chunk images for the current zoom, keyed by chunk index
+    _chunkSidelen: int | None
+    _chunkCache: dict[tuple[int, int], _ChunkImage]
+    _dirtyChunks: set[tuple[int, int]]
+
+    def _initBlocks(self, blockIds: np.ndarray) -> None:
+        super()._initBlocks(blockIds)
+        self.renders = self.patches = 0
+        self._chunkSidelen = None
+        self._chunkCache = {}
+        self._dirtyChunks = set()
+
+    def _changed(self, ix0: int, iy0: int, ix1: int, iy1: int) -> None:
+        super()._changed(ix0, iy0, ix1, iy1)
+        C = CHUNK_SIDELEN
+        for cx in range(ix0 // C, -(-ix1 // C)):
+            for cy in range(iy0 // C, -(-iy1 // C)):
+                if (cx, cy) in self._chunkCache:
+                    self._dirtyChunks.add((cx, cy))
+
+    @property
+    def dirtyChunks(self) -> frozenset[tuple[int, int]]:
+        # chunks written to since they were last drawn
+        return frozenset(self._dirtyChunks)
+
+    def _chunkBlocks(self, cx: int, cy: int) -> np.ndarray:
+        C = CHUNK_SIDELEN
+        return self.blockIds[cx*C:(cx+1)*C, cy*C:(cy+1)*C]
+
+    def _renderChunk(self, cx: int, cy: int, a: int) -> _ChunkImage:
+        # composes the blocks of chunk (cx, cy) into one image at `a` px/block
+        blockIds = self._chunkBlocks(cx, cy).copy()
+        img = composeBlocks(blockIds, a)
+        self.renders += 1
+        return _ChunkImage(blockIds, img)
+
+    def _patchChunk(
+            self, cx: int, cy: int, a: int, entry: _ChunkImage) -> _ChunkImage:
+        # repaints the blocks of chunk (cx, cy) that differ from what `entry`
+        # shows, reusing its images
+        current = self._chunkBlocks(cx, cy)
+        changed = np.argwhere(current != entry.blockIds).tolist()
+        if not changed:
+            return entry
+        if entry.image is None:
+            # nothing was drawn before, so there is no image to patch
+            return self._renderChunk(cx, cy, a)
+        table = blockRegistry().table
+        # patched on a copy, as renderers may remember images by identity
+        image = entry.image = entry.image.copy()
+        for i, j in changed:
+            txr = table[current[i, j]].scaled_texture(a)
+            if txr is None:
+                image.paste((0, 0, 0, 0), (i*a, j*a, (i+1)*a, (j+1)*a))
             else:
-                resample = Image.Resampling.BICUBIC
-
-            return self.texture.resize((sidelen, sidelen), resample=resample)
-
-    def scaled_texture_tk(self, sidelen: int) -> ImageTk.PhotoImage | None:
-        if self.texture is None:
-            return None
-        else:
-            return ImageTk.PhotoImage(self.scaled_texture(sidelen))
-
-
-BLOCK_SPECS: Final = {
-    k: BlockSpec(v) for k, v in
-        json.load((RCSDIR/'block_types.json').open()).items() }
-BLOCK_INVREF: Final = { v.mapLegend: k for k, v in BLOCK_SPECS.items() }
-
-
-class Grid:
-
-    size: tuple[int, int]
-    blocks: list[list[str]]
-
-    def __init__(self, mapName: str) -> None:
-        mapImg = Image.open(MAPDIR/mapName).convert(mode='RGB')
-        w, h = mapImg.size
-        self.size = w, h
-        self.blocks = [
-            [BLOCK_INVREF[mapImg.getpixel((i,j))] for j in range(h)]
-            for i in range(w) ]
+                image.paste(txr, (i*a, j*a))
+        if entry.photo is not None:
+            entry.photo.paste(image)  # same PhotoImage, new pixels
+        entry.blockIds[...] = current
+        self.patches += 1
+        return entry
+
+    def _chunkEntry(self, cx: int, cy: int, a: int) -> _ChunkImage:
+        if a != self._chunkSidelen:
+            # zoom changed; only the current zoom level is kept
+            self._chunkCache.clear()
+            self._dirtyChunks.clear()
+            self._chunkSidelen = a
+        key = cx, cy
+        entry = self._chunkCache.get(key)
+        if entry is None:
+            entry = self._renderChunk(cx, cy, a)
+        elif key in self._dirtyChunks:
+            entry = self._patchChunk(cx, cy, a, entry)
+        self._dirtyChunks.discard(key)
+        self._chunkCache[key] = entry
+        return entry
 
     def draw(
             self,
@@ -79,20 +143,62 @@ class Grid:
             canvas: WrappedCanvas,
             blockSidelen: int,
             originCartesian: R2,
+            mode: RenderMode = 'tiles',
+            ) -> None:
+        self.render(
+            TkRenderer(app, canvas), blockSidelen, originCartesian, mode)
+
+    def render(
+            self,
+            renderer: Renderer,
+            blockSidelen: int,
+            originCartesian: R2,
+            mode: RenderMode = 'tiles',
             ) -> None:
         w, h = self.size
-        a = blockSidelen
+        a, originCartesian = quantizeZoom(blockSidelen, originCartesian)
         oriX, oriY = map(round, originCartesian)
-        appW, appH = app.width, app.height
+        appW, appH = renderer.width, renderer.height
         _gridW, gridH = w*a, h*a
         oriY = gridH - oriY  # from Cartesian to Window
         minX = appW // 2 - oriX
         minY = appH // 2 - oriY
-
-        for ix, col in enumerate(self.blocks):
-            for iy, blockKind in enumerate(col):
-                txr = BLOCK_SPECS[blockKind].scaled_texture_tk(a)
-                if txr is not None:
-                    x = minX + ix*a
-                    y = minY + iy*a
-                    canvas.create_image(x, y, image=txr, anchor=tk.NW)
+        # Tk renderers take the PhotoImages cached next to the PIL images
+        tkRenderer = (
+            renderer if isinstance(renderer, PhotoRenderer) else None)
+
+        # only what overlaps the window is touched
+        if mode == 'chunks':
+            C = CHUNK_SIDELEN
+            cxs = visibleRange(minX, C*a, -(-w // C), appW)
+            cys = visibleRange(minY, C*a, -(-h // C), appH)
+            for cx in cxs:
+                for cy in cys:
+                    entry = self._chunkEntry(cx, cy, a)
+                    if entry.image is None:
+                        continue
+                    x = minX + cx*C*a
+                    y = minY + cy*C*a
+                    if tkRenderer is None:
+                        renderer.image(x, y, entry.image)
+                        continue
+                    if entry.photo is None:
+                        entry.photo = tkRenderer.toPhoto(entry.image)
+                    tkRenderer.photo(x, y, entry.photo)
+            return
+
+        table = blockRegistry().table
+        ixs = visibleRange(minX, a, w, appW)
+        iys = visibleRange(minY, a, h, appH)
+        visible = self.blockIds[ixs.start:ixs.stop, iys.start:iys.stop].tolist()
+        for ix, col in zip(ixs, visible):
+            for iy, blockId in zip(iys, col):
+                spec = table[blockId]
+                if tkRenderer is None:
+                    txr = spec.scaled_texture(a)
+                    if txr is not None:
+                        renderer.image(minX + ix*a, minY + iy*a, txr)
+                else:
+                    photo = spec.scaled_texture_tk(a, tkRenderer)
+                    if photo is not None:
+                        tkRenderer.photo(minX + ix*a, minY + iy*a, photo)
@@ -1,5 +1,14 @@
 from __future__ import annotations
-from custom_types import R2, P3, R2Pair
+import heapq
+import math
+import numpy as np
+from bisect import bisect_left
+from custom_types import R2, P3, R2Pair, SegPairHit
+from collections.abc import Iterator, Sequence
+from fractions import Fraction
+from itertools import combinations
+from numpy.typing import ArrayLike
+from typing import Final
 
 def floatNear(a: float, b: float, epsilon: float) -> bool:
     return abs(a - b) <= epsilon
@@ -54,23 +63,539 @@ def projectionR2(a: R2, b: R2) -> R2:
     # given R2 vectors a and b, returns x̂a (see `projCoefR2`)
     return scaleR2(a, projCoefR2(a, b))
 
+# Orientation predicate, filtered as in Shewchuk's orient2d: the float result
+# is used when it is further from 0 than its worst-case rounding error, and
+# the determinant is computed exactly with `Fraction`s otherwise
+_ORIENT_ERRBOUND: Final = (3 + 16 * 2.0**-53) * 2.0**-53
+
+def _orient(
+        ax: float, ay: float, bx: float, by: float, cx: float, cy: float,
+        ) -> float:
+    # (b - a) x (c - a): positive if a, b, c turn counterclockwise, negative
+    # if clockwise, 0 if collinear; the sign is exact for the given floats,
+    # the magnitude is rounded
+    dbx, dby = bx - ax, by - ay
+    dcx, dcy = cx - ax, cy - ay
+    l = dbx*dcy
+    r = dby*dcx
+    det = l - r
+    if abs(det) > _ORIENT_ERRBOUND * (abs(l) + abs(r)):
+        return det
+    # both products exactly 0, as often with axis-aligned input
+    if (dbx == 0 or dcy == 0) and (dby == 0 or dcx == 0):
+        return 0.0
+    return _orientExact(ax, ay, bx, by, cx, cy)
+
+def _orientExact(
+        ax: float, ay: float, bx: float, by: float, cx: float, cy: float,
+        ) -> float:
+    F = Fraction
+    det = (F(bx) - F(ax))*(F(cy) - F(ay)) - (F(by) - F(ay))*(F(cx) - F(ax))
+    if det == 0: return 0.0
+    # keeps the sign even if the magnitude underflows
+    return float(det) or math.copysign(math.ulp(0.0), det)
+
+def _within(
+        ax: float, ay: float, bx: float, by: float, qx: float, qy: float,
+        ) -> bool:
+    # whether q is in the bounding box of a and b; for q on the line through
+    # a and b, whether it is on the segment
+    return (min(ax, bx) <= qx <= max(ax, bx)
+            and min(ay, by) <= qy <= max(ay, by))
+
+def _position(
+        ax: float, ay: float, bx: float, by: float, qx: float, qy: float,
+        ) -> float:
+    # position of q, on the segment from a to b, along it (0 to 1)
+    dx, dy = bx - ax, by - ay
+    dd = dx*dx + dy*dy
+    if dd == 0: return 0.0
+    return min(max(((qx - ax)*dx + (qy - ay)*dy) / dd, 0.0), 1.0)
+
+def _touchCollision(
+        px0: float, py0: float, px1: float, py1: float,
+        sx0: float, sy0: float, sx1: float, sy1: float,
+        ) -> float | None:
+    # `pathSegCollision` when neither segment crosses the other's line: the
+    # path and the segment are collinear and overlap, or (at least) one of
+    # them is a point lying on the other's line
+    if _within(sx0, sy0, sx1, sy1, px0, py0): return 0.0
+    ts = [
+        _position(px0, py0, px1, py1, qx, qy)
+        for qx, qy in ((sx0, sy0), (sx1, sy1))
+        if _within(px0, py0, px1, py1, qx, qy)]
+    return min(ts, default=None)
+
 def pathSegCollision(path: R2Pair, seg: R2Pair) -> float | None:
     # similar to `intersection`, but returns the position of intersection
     # relative to the length of `path` if there is intersection, otherwise None
     # e.g.
     # intersection( ((0,1),(5,1)), ((2,0),(2,3)) ) == (2,1)
     # pathSegCollision( ((0,1),(5,1)), ((2,0),(2,3)) ) == 0.4
-    inter = intersection(path, seg)
-    if inter is None: return None
-
-    pathStart, pathEnd = path
-    segStart, segEnd = seg
-    positionOnPath = projCoefR2(
-        subR2(pathEnd, pathStart), subR2(inter, pathStart))
-    positionOnSeg = projCoefR2(
-        subR2(segEnd, segStart), subR2(inter, segStart))
-
-    if (0.0 <= positionOnPath <= 1.0) and (0.0 <= positionOnSeg <= 1.0):
-        return positionOnPath
-    else:
-        return None
+    # Both are closed: touching counts. Whether they touch is decided exactly
+    # (see `_orient`), so there are no false hits or misses from rounding;
+    # zero-length paths and segments are points, and where `path` runs along
+    # `seg`, the first point they share is reported.
+    (px0, py0), (px1, py1) = path
+    (sx0, sy0), (sx1, sy1) = seg
+    # sides of the line through `seg` the ends of `path` are on, and v.v.
+    d0 = _orient(sx0, sy0, sx1, sy1, px0, py0)
+    d1 = _orient(sx0, sy0, sx1, sy1, px1, py1)
+    if (d0 > 0 and d1 > 0) or (d0 < 0 and d1 < 0): return None
+    e0 = _orient(px0, py0, px1, py1, sx0, sy0)
+    e1 = _orient(px0, py0, px1, py1, sx1, sy1)
+    if (e0 > 0 and e1 > 0) or (e0 < 0 and e1 < 0): return None
+    if d0 != d1:
+        # `path` crosses the line, at the ratio of the ends' distances to it
+        return d0 / (d0 - d1)
+    return _touchCollision(px0, py0, px1, py1, sx0, sy0, sx1, sy1)
+
+Cell = tuple[int, int]
+
+class SegmentIndex:
+    '''
+    Uniform-grid spatial index over line segments, for path queries that only
+    look at the segments near the path instead of scanning all of them.
+
+    Every segment is registered in the grid cells its bounding box overlaps;
+    `query_path` walks the cells the path crosses (Amanatides-Woo traversal),
+    and runs `pathSegCollision` on the segments it finds there. Results are
+    identical to the brute-force scan
+
+        sorted((t, k) for k, s in index.segments.items()
+               if (t:=pathSegCollision(path, s)) is not None)
+
+    For best results pick `cellSize` around the typical segment length.
+    '''
+
+    cellSize: float
+    segments: dict[int, R2Pair]
+
+    _cells: dict[Cell, set[int]]
+    _segCells: dict[int, list[Cell]]
+    _bounds: tuple[int, int, int, int] | None  # cell index bounds, grow-only
+    _nextKey: int
+
+    def __init__(self, cellSize: float = 64.0) -> None:
+        if not cellSize > 0:
+            raise ValueError(f"cellSize must be positive, got {cellSize!r}")
+        self.cellSize = cellSize
+        self.segments = {}
+        self._cells = {}
+        self._segCells = {}
+        self._bounds = None
+        self._nextKey = 0
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.segments
+
+    def _cellRange(self, lo: R2, hi: R2) -> tuple[int, int, int, int]:
+        # cells overlapping the box [lo, hi], padded a hair so that points on
+        # cell boundaries are registered on both sides
+        cs = self.cellSize
+        pad = cs * 1E-9
+        (x0, y0), (x1, y1) = lo, hi
+        return (
+            math.floor((x0 - pad) / cs), math.floor((y0 - pad) / cs),
+            math.floor((x1 + pad) / cs), math.floor((y1 + pad) / cs),
+        )
+
+    def insert(self, seg: R2Pair, key: int | None = None) -> int:
+        # adds `seg` under `key` (or a fresh key) and returns the key
+        if key is None:
+            key = self._nextKey
+        elif key in self.segments:
+            raise ValueError(f"key {key!r} is already in the index")
+        self._nextKey = max(self._nextKey, key + 1)
+
+        (sx, sy), (ex, ey) = seg
+        cx0, cy0, cx1, cy1 = self._cellRange(
+            (min(sx, ex), min(sy, ey)), (max(sx, ex), max(sy, ey)))
+        cells = [(i, j) for i in range(cx0, cx1 + 1)
+                        for j in range(cy0, cy1 + 1)]
+        for c in cells:
+            self._cells.setdefault(c, set()).add(key)
+
+        self.segments[key] = seg
+        self._segCells[key] = cells
+        if self._bounds is None:
+            self._bounds = (cx0, cy0, cx1, cy1)
+        else:
+            bx0, by0, bx1, by1 = self._bounds
+            self._bounds = (
+                min(bx0, cx0), min(by0, cy0), max(bx1, cx1), max(by1, cy1))
+        return key
+
+    def remove(self, key: int) -> R2Pair:
+        # removes and returns the segment stored under `key`
+        seg = self.segments.pop(key)
+        for c in self._segCells.pop(key):
+            keys = self._cells[c]
+            keys.discard(key)
+            if not keys: del self._cells[c]
+        return seg
+
+    def query_rect(self, lo: R2, hi: R2) -> set[int]:
+        # keys of the segments whose bounding boxes overlap the box [lo, hi]
+        if self._bounds is None: return set()
+        bx0, by0, bx1, by1 = self._bounds
+        cx0, cy0, cx1, cy1 = self._cellRange(lo, hi)
+        cells = self._cells
+        found: set[int] = set()
+        for i in range(max(cx0, bx0), min(cx1, bx1) + 1):
+            for j in range(max(cy0, by0), min(cy1, by1) + 1):
+                keys = cells.get((i, j))
+                if keys: found |= keys
+
+        # padded like the cells, so that rounding in `pathSegCollision` near
+        # the edges cannot produce hits outside of the returned set
+        pad = self.cellSize * 1E-9
+        (x0, y0), (x1, y1) = lo, hi
+        x0, y0, x1, y1 = x0 - pad, y0 - pad, x1 + pad, y1 + pad
+        segments = self.segments
+        overlapping: set[int] = set()
+        for k in found:
+            (sx, sy), (ex, ey) = segments[k]
+            if (min(sx, ex) <= x1 and x0 <= max(sx, ex)
+                    and min(sy, ey) <= y1 and y0 <= max(sy, ey)):
+                overlapping.add(k)
+        return overlapping
+
+    def _clipToBounds(self, path: R2Pair) -> tuple[float, float] | None:
+        # parameter range of `path` inside the occupied cells (slab method)
+        if self._bounds is None: return None
+        cs = self.cellSize
+        bx0, by0, bx1, by1 = self._bounds
+        t0, t1 = 0.0, 1.0
+        (sx, sy), (ex, ey) = path
+        for s, d, lo, hi in (
+                (sx, ex - sx, (bx0 - 1)*cs, (bx1 + 2)*cs),
+                (sy, ey - sy, (by0 - 1)*cs, (by1 + 2)*cs)):
+            if d == 0:
+                if not lo <= s <= hi: return None
+                continue
+            u0, u1 = (lo - s) / d, (hi - s) / d
+            if u0 > u1: u0, u1 = u1, u0
+            t0, t1 = max(t0, u0), min(t1, u1)
+            if t0 > t1: return None
+        return t0, t1
+
+    def _traverse(self, path: R2Pair) -> Iterator[Cell]:
+        # yields the cells crossed by `path`, in order (Amanatides-Woo)
+        clipped = self._clipToBounds(path)
+        if clipped is None: return
+        t0, t1 = clipped
+        cs = self.cellSize
+        (sx, sy), (ex, ey) = path
+        dx, dy = ex - sx, ey - sy
+        x0, y0 = sx + dx*t0, sy + dy*t0
+        x1, y1 = sx + dx*t1, sy + dy*t1
+
+        cx, cy = math.floor(x0 / cs), math.floor(y0 / cs)
+        tx, ty = math.floor(x1 / cs), math.floor(y1 / cs)
+        stepX = (dx > 0) - (dx < 0)
+        stepY = (dy > 0) - (dy < 0)
+        inf = math.inf
+        tMaxX = ((cx + (dx > 0))*cs - x0) / dx if dx else inf
+        tMaxY = ((cy + (dy > 0))*cs - y0) / dy if dy else inf
+        tDeltaX = cs / abs(dx) if dx else inf
+        tDeltaY = cs / abs(dy) if dy else inf
+
+        yield cx, cy
+        for _ in range(abs(tx - cx) + abs(ty - cy)):
+            # the guards keep rounding error from overshooting the last cell
+            if cy == ty or (cx != tx and tMaxX < tMaxY):
+                cx += stepX
+                tMaxX += tDeltaX
+            else:
+                cy += stepY
+                tMaxY += tDeltaY
+            yield cx, cy
+
+    def query_path(self, path: R2Pair) -> list[tuple[float, int]]:
+        # returns (position along `path`, key) for every segment hit by `path`,
+        # sorted by position; positions are as in `pathSegCollision`
+        cells = self._cells
+        segments = self.segments
+        seen: set[int] = set()
+        hits: list[tuple[float, int]] = []
+        for c in self._traverse(path):
+            keys = cells.get(c)
+            if not keys: continue
+            for k in keys:
+                if k in seen: continue
+                seen.add(k)
+                t = pathSegCollision(path, segments[k])
+                if t is not None: hits.append((t, k))
+        hits.sort()
+        return hits
+
+
+def allIntersections(
+        segs: Sequence[R2Pair], epsilon: float = 1E-9) -> list[SegPairHit]:
+    '''
+    Find every intersecting pair among `segs` with a Bentley-Ottmann sweep,
+    in O((n+k) log n) comparisons for n segments and k intersecting pairs.
+
+    Returns `(i, j, point, ti, tj)` with i < j for each pair, in sweep order
+    (left to right, then bottom to top), where `ti`, `tj` are the positions of
+    `point` along `segs[i]`, `segs[j]` (0 at the start, 1 at the end). Segments
+    are closed: touching endpoints count. Vertical segments, zero-length
+    segments and several segments through one point are supported; collinear
+    overlapping segments are reported once, at the first point of the overlap
+    in sweep order.
+
+    Points closer than `epsilon` (relative to the largest coordinate) are
+    considered the same.
+
+    The sweep status is a plain list kept ordered with `bisect`; inserts and
+    deletes are memmoves, which beat a pure-Python balanced tree for any input
+    that fits in memory.
+    '''
+    n = len(segs)
+    if n < 2: return []
+    scale = max(1.0, max(abs(c) for seg in segs for pt in seg for c in pt))
+    tol = epsilon * scale
+
+    # each segment runs left to right (bottom to top if vertical)
+    lefts: list[R2] = []
+    rights: list[R2] = []
+    starts: dict[R2, list[int]] = {}  # left endpoint -> segments
+    ends: dict[R2, list[int]] = {}    # right endpoint -> segments
+    points: dict[R2, list[int]] = {}  # zero-length segments
+    inters: dict[R2, set[int]] = {}   # crossing point -> segments
+    queue: list[R2] = []
+    queued: set[R2] = set()
+
+    def push(p: R2) -> None:
+        if p not in queued:
+            queued.add(p)
+            heapq.heappush(queue, p)
+
+    for i, ((x0, y0), (x1, y1)) in enumerate(segs):
+        a, b = (float(x0), float(y0)), (float(x1), float(y1))
+        if b < a: a, b = b, a
+        lefts.append(a)
+        rights.append(b)
+        if a == b:
+            points.setdefault(a, []).append(i)
+        else:
+            starts.setdefault(a, []).append(i)
+            ends.setdefault(b, []).append(i)
+            push(b)
+        push(a)
+
+    def keyAt(i: int) -> float:
+        # height of segment i on the sweep line through the event point
+        (x0, y0), (x1, y1) = lefts[i], rights[i]
+        if x0 == x1: return min(max(py, y0), y1)
+        if px <= x0: return y0
+        if px >= x1: return y1
+        return y0 + (y1 - y0) * (px - x0) / (x1 - x0)
+
+    def slope(i: int) -> float:
+        (x0, y0), (x1, y1) = lefts[i], rights[i]
+        return (y1 - y0) / (x1 - x0) if x0 != x1 else math.inf
+
+    def contains(i: int) -> bool:
+        (x0, y0), (x1, y1) = lefts[i], rights[i]
+        if not x0 - tol <= px <= x1 + tol: return False
+        dx, dy = x1 - x0, y1 - y0
+        t = ((px - x0)*dx + (py - y0)*dy) / (dx*dx + dy*dy)
+        t = min(max(t, 0.0), 1.0)
+        ex, ey = px - (x0 + t*dx), py - (y0 + t*dy)
+        return ex*ex + ey*ey <= tol*tol
+
+    def crossing(a: int, b: int) -> R2 | None:
+        (ax0, ay0), (ax1, ay1) = lefts[a], rights[a]
+        (bx0, by0), (bx1, by1) = lefts[b], rights[b]
+        d1x, d1y = ax1 - ax0, ay1 - ay0
+        d2x, d2y = bx1 - bx0, by1 - by0
+        den = d1x*d2y - d1y*d2x
+        len1, len2 = math.hypot(d1x, d1y), math.hypot(d2x, d2y)
+        # (near-)parallel; collinear overlaps are found at their endpoints
+        if abs(den) <= 1E-12 * len1 * len2: return None
+        ex, ey = bx0 - ax0, by0 - ay0
+        t = (ex*d2y - ey*d2x) / den
+        u = (ex*d1y - ey*d1x) / den
+        st, su = tol / len1, tol / len2
+        if not (-st <= t <= 1 + st and -su <= u <= 1 + su): return None
+        t = min(max(t, 0.0), 1.0)
+        return (ax0 + t*d1x, ay0 + t*d1y)
+
+    def checkPair(a: int, b: int) -> None:
+        q = crossing(a, b)
+        if q is None: return
+        qx, qy = q
+        if q <= (px, py) or (abs(qx - px) <= tol and abs(qy - py) <= tol):
+            return  # behind the sweep line, or already being handled
+        inters.setdefault(q, set()).update((a, b))
+        push(q)
+
+    def position(i: int, p: R2) -> float:
+        (x0, y0), (x1, y1) = segs[i]
+        dx, dy = x1 - x0, y1 - y0
+        dd = dx*dx + dy*dy
+        if dd == 0: return 0.0
+        t = ((p[0] - x0)*dx + (p[1] - y0)*dy) / dd
+        return min(max(t, 0.0), 1.0)
+
+    status: list[int] = []
+    inStatus: set[int] = set()
+    reported: set[tuple[int, int]] = set()
+    result: list[SegPairHit] = []
+
+    while queue:
+        p = heapq.heappop(queue)
+        px, py = p
+
+        # segments in the status through p form a contiguous run
+        mid = bisect_left(status, py, key=keyAt)
+        lo, hi = mid, mid
+        while lo > 0 and contains(status[lo - 1]): lo -= 1
+        while hi < len(status) and contains(status[hi]): hi += 1
+        through = status[lo:hi]
+        del status[lo:hi]
+        inStatus.difference_update(through)
+        # stragglers that rounding put out of place
+        for i in (*ends.get(p, ()), *inters.pop(p, ())):
+            if i in inStatus:
+                status.remove(i)
+                inStatus.discard(i)
+                through.append(i)
+
+        here = sorted({*through, *starts.get(p, ()), *points.get(p, ())})
+        for i, j in combinations(here, 2):
+            if (i, j) not in reported:
+                reported.add((i, j))
+                result.append((i, j, p, position(i, p), position(j, p)))
+
+        ending = set(ends.get(p, ()))
+        cont = [i for i in (*through, *starts.get(p, ())) if i not in ending]
+        cont.sort(key=lambda i: (slope(i), i))  # order just past p
+        pos = bisect_left(status, py, key=keyAt)
+        status[pos:pos] = cont
+        inStatus.update(cont)
+
+        if cont:
+            if pos > 0:
+                checkPair(status[pos - 1], cont[0])
+            if pos + len(cont) < len(status):
+                checkPair(cont[-1], status[pos + len(cont)])
+        elif 0 < pos < len(status):
+            checkPair(status[pos - 1], status[pos])
+
+    return result
+
+
+# batched variants (NumPy); the arithmetic mirrors the scalar functions above
+# operation-for-operation, so results agree exactly, with NaN standing in for
+# None
+
+def _linesP3Batch(lines: np.ndarray) -> np.ndarray:
+    # (..., 2, 2) endpoint pairs -> (..., 3) homogeneous lines; same as
+    # `crossP3(*map(p3FromR2, line))`
+    (x1, y1), (x2, y2) = np.moveaxis(lines, (-2, -1), (0, 1))
+    return np.stack((y1 - y2, x2 - x1, x1*y2 - y1*x2), axis=-1)
+
+def intersectionBatch(lines1: ArrayLike, lines2: ArrayLike) -> np.ndarray:
+    # takes N lines and M lines as (N, 2, 2) and (M, 2, 2) arrays of endpoint
+    # pairs; returns an (N, M, 2) array of intersection points, NaN where the
+    # lines are parallel (i.e. where `intersection` returns None)
+    l1 = _linesP3Batch(np.asarray(lines1, dtype=np.float64))[:, None, :]
+    l2 = _linesP3Batch(np.asarray(lines2, dtype=np.float64))[None, :, :]
+    a1, a2, a3 = l1[..., 0], l1[..., 1], l1[..., 2]
+    b1, b2, b3 = l2[..., 0], l2[..., 1], l2[..., 2]
+    c1 = a2*b3 - a3*b2
+    c2 = a3*b1 - a1*b3
+    c3 = a1*b2 - a2*b1
+    parallel = np.abs(c3) <= 1E-10
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.stack((c1/c3, c2/c3), axis=-1)
+    out[parallel] = np.nan
+    return out
+
+def _orientBatch(
+        ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+        cx: np.ndarray, cy: np.ndarray,
+        ) -> np.ndarray:
+    # `_orient`, broadcast; entries the filter cannot decide are exact zeros
+    # as often with axis-aligned input, or go through `_orientExact` one by
+    # one
+    dbx, dby = bx - ax, by - ay
+    dcx, dcy = cx - ax, cy - ay
+    l = dbx*dcy
+    r = dby*dcx
+    det = l - r
+    # the error bound, in place of `l`
+    bound = np.abs(l, out=l)
+    bound += np.abs(r, out=r)
+    bound *= _ORIENT_ERRBOUND
+    unsure = np.nonzero(~(np.abs(det) > bound))
+    if len(unsure[0]):
+        d = [np.broadcast_to(v, det.shape)[unsure]
+             for v in (dbx, dcy, dby, dcx)]
+        zero = ((d[0] == 0) | (d[1] == 0)) & ((d[2] == 0) | (d[3] == 0))
+        det[tuple(k[zero] for k in unsure)] = 0.0
+        exact = tuple(k[~zero] for k in unsure)
+        if len(exact[0]):
+            pts = [np.broadcast_to(v, det.shape)[exact].tolist()
+                   for v in (ax, ay, bx, by, cx, cy)]
+            det[exact] = [_orientExact(*pt) for pt in zip(*pts)]
+    return det
+
+def _pathSegCollisionBroadcast(
+        paths: np.ndarray, segs: np.ndarray) -> np.ndarray:
+    # `pathSegCollision` over (..., 2, 2) arrays of paths and segments,
+    # broadcast against each other; NaN where there is no collision
+    px0, py0 = paths[..., 0, 0], paths[..., 0, 1]
+    px1, py1 = paths[..., 1, 0], paths[..., 1, 1]
+    sx0, sy0 = segs[..., 0, 0], segs[..., 0, 1]
+    sx1, sy1 = segs[..., 1, 0], segs[..., 1, 1]
+    d0 = _orientBatch(sx0, sy0, sx1, sy1, px0, py0)
+    d1 = _orientBatch(sx0, sy0, sx1, sy1, px1, py1)
+    out = np.full(d0.shape, np.nan)
+
+    # the other side of the test only for the pairs where `path` reaches the
+    # line through `seg`, which are usually few
+    idx = np.nonzero(~(((d0 > 0) & (d1 > 0)) | ((d0 < 0) & (d1 < 0))))
+    d0, d1 = d0[idx], d1[idx]
+    p = np.broadcast_to(paths, out.shape + (2, 2))[idx]
+    s = np.broadcast_to(segs, out.shape + (2, 2))[idx]
+    e0 = _orientBatch(
+        p[:, 0, 0], p[:, 0, 1], p[:, 1, 0], p[:, 1, 1], s[:, 0, 0], s[:, 0, 1])
+    e1 = _orientBatch(
+        p[:, 0, 0], p[:, 0, 1], p[:, 1, 0], p[:, 1, 1], s[:, 1, 0], s[:, 1, 1])
+    touch = ~(((e0 > 0) & (e1 > 0)) | ((e0 < 0) & (e1 < 0)))
+
+    cross = touch & (d0 != d1)
+    out[tuple(k[cross] for k in idx)] = (
+        d0[cross] / (d0[cross] - d1[cross]))
+    # collinear and degenerate pairs are rare; they go one by one
+    for k in np.flatnonzero(touch & (d0 == d1)).tolist():
+        t = _touchCollision(*p[k].ravel().tolist(), *s[k].ravel().tolist())
+        out[tuple(a[k] for a in idx)] = np.nan if t is None else t
+    return out
+
+def pathSegCollisionBatch(paths: ArrayLike, segs: ArrayLike) -> np.ndarray:
+    # batched `pathSegCollision`: takes N paths and M segments as (N, 2, 2) and
+    # (M, 2, 2) arrays; returns an (N, M) array of positions along each path,
+    # NaN where there is no collision
+    # e.g.
+    # pathSegCollisionBatch([((0,1),(5,1))], [((2,0),(2,3)), ((0,2),(5,2))])
+    #     == [[0.4, nan]]
+    paths = np.asarray(paths, dtype=np.float64).reshape(-1, 2, 2)
+    segs = np.asarray(segs, dtype=np.float64).reshape(-1, 2, 2)
+    return _pathSegCollisionBroadcast(paths[:, None], segs[None, :])
+
+def pathSegCollisionPairs(paths: ArrayLike, segs: ArrayLike) -> np.ndarray:
+    # `pathSegCollision` for matching pairs: takes paths and segments as
+    # arrays of shape (..., 2, 2) that broadcast together, e.g. both (K, 2, 2)
+    # for K pairs; returns the positions along each path, NaN where there is
+    # no collision, for when a broad phase has already picked the pairs
+    paths = np.asarray(paths, dtype=np.float64)
+    segs = np.asarray(segs, dtype=np.float64)
+    return _pathSegCollisionBroadcast(paths, segs)
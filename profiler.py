@@ -0,0 +1,297 @@
+from __future__ import annotations
+import csv
+import dataclasses
+import json
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from eventsync import ESync, _EventSyncronizer
+from functools import wraps
+from pathlib import Path
+from texture_cache import TextureCache
+from typing import Any
+
+
+@dataclasses.dataclass
+class FrameStats:
+    frame: int
+    start: float             # `time.perf_counter` when the tick began
+    queueDepth: int = 0      # events waiting in ESync when the tick began
+    eventsDispatched: int = 0
+    canvasItems: int = 0     # canvas items created by `redrawAll`
+    textureHits: int = 0
+    textureMisses: int = 0
+    # (phase, start, duration) for "dispatch", "timerFired", "redrawAll" and
+    # every instrumented call, in the order they finished
+    spans: list[tuple[str, float, float]] = dataclasses.field(
+        default_factory=list)
+
+    def phaseTimes(self) -> dict[str, float]:
+        # total seconds per phase; nested phases are also counted in the
+        # phases around them
+        times: dict[str, float] = {}
+        for name, _, dur in self.spans:
+            times[name] = times.get(name, 0.0) + dur
+        return times
+
+
+class _CountingCanvas:
+    '''
+    Stands in for the canvas passed to `redrawAll`, counting `create_*`
+    calls.
+    '''
+
+    def __init__(self, canvas: Any) -> None:
+        self._canvas = canvas
+        self.items = 0
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._canvas, name)
+        if not name.startswith('create_'):
+            return attr
+        def counted(*a, **kw):
+            self.items += 1
+            return attr(*a, **kw)
+        return counted
+
+
+class FrameProfiler:
+    '''
+    Opt-in per-frame instrumentation of the App loop.
+
+    While enabled, every call of the `ESync.hook` function (one frame) is
+    timed in phases: "dispatch" (ESync handing out queued events) and
+    "timerFired" (the hooked function itself), plus "redrawAll" for a
+    `redrawAll` decorated with `.redraw`, and any method registered with
+    `.instrument` (e.g. `AASystem.step`, `Grid.draw`). Each frame also
+    records the ESync queue depth, the events dispatched, the canvas items
+    created, and hits and misses of `textureCache`.
+
+    The last `capacity` frames are kept in `frames`, and can be written out
+    with `toCSV` or `toChromeTrace` (for chrome://tracing or Perfetto).
+
+    Disabled (the default), ESync pays one `is None` check per tick, `.redraw`
+    one attribute check per redraw, and instrumented methods are untouched.
+
+    Usage example:
+
+        PROFILER = FrameProfiler(textureCache=TEXTURE_CACHE)
+
+        @PROFILER.redraw
+        def redrawAll(app, canvas):
+            ...
+
+        def appStarted(app):
+            ...
+            PROFILER.instrument(data.aasys, 'step', 'physics')
+            PROFILER.enable()
+
+        def appStopped(app):
+            PROFILER.disable()
+            PROFILER.toChromeTrace('trace.json')
+    '''
+
+    capacity: int
+    textureCache: TextureCache | None
+    frames: deque[FrameStats]
+    enabled: bool
+
+    _esync: _EventSyncronizer
+    _frameCount: int
+    _current: FrameStats | None
+    _cache0: tuple[int, int]
+    _instruments: list[tuple[Any, str, str]]
+    _installed: list[tuple[Any, str, bool, Any]]
+
+    def __init__(
+            self,
+            capacity: int = 1024,
+            textureCache: TextureCache | None = None,
+            esync: _EventSyncronizer = ESync,
+            ) -> None:
+        self.capacity = capacity
+        self.textureCache = textureCache
+        self.frames = deque(maxlen=capacity)
+        self.enabled = False
+        self._esync = esync
+        self._frameCount = 0
+        self._current = None
+        self._cache0 = (0, 0)
+        self._instruments = []
+        self._installed = []
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self._esync.profiler = self
+        for obj, attr, phase in self._instruments:
+            self._install(obj, attr, phase)
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._esync.profiler is self:
+            self._esync.profiler = None
+        for obj, attr, own, original in reversed(self._installed):
+            if own:
+                setattr(obj, attr, original)
+            else:
+                delattr(obj, attr)  # the class attribute shows through again
+        self._installed.clear()
+        self._current = None
+
+    def clear(self) -> None:
+        self.frames.clear()
+        self._current = None
+
+    def _cacheCounts(self) -> tuple[int, int]:
+        c = self.textureCache
+        return (0, 0) if c is None else (c.hits, c.misses)
+
+    def _updateCache(self, frame: FrameStats) -> None:
+        hits, misses = self._cacheCounts()
+        frame.textureHits = hits - self._cache0[0]
+        frame.textureMisses = misses - self._cache0[1]
+
+    def tick(
+            self, esync: _EventSyncronizer, call: Callable, *a, **kw
+            ) -> Any:
+        # called by the `ESync.hook` wrapper in place of its usual body
+        start = time.perf_counter()
+        frame = FrameStats(self._frameCount, start, esync.queueDepth())
+        self._frameCount += 1
+        self._cache0 = self._cacheCounts()
+        self.frames.append(frame)
+        self._current = frame
+
+        frame.eventsDispatched = esync._dispatch(call)
+        t1 = time.perf_counter()
+        frame.spans.append(("dispatch", start, t1 - start))
+        try:
+            return call(*a, **kw)
+        finally:
+            t2 = time.perf_counter()
+            frame.spans.append(("timerFired", t1, t2 - t1))
+            self._updateCache(frame)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # times the body as phase `name` of the current frame
+        frame = self._current
+        if not self.enabled or frame is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            frame.spans.append((name, start, time.perf_counter() - start))
+
+    def redraw(self, call: Callable[[Any, Any], Any]) -> Callable:
+        '''
+        Wrap `redrawAll` to time it as part of the current frame and count the
+        canvas items it creates.
+        '''
+        @wraps(call)
+        def __inner(app, canvas):
+            frame = self._current
+            if not self.enabled or frame is None:
+                return call(app, canvas)
+            counting = _CountingCanvas(canvas)
+            start = time.perf_counter()
+            try:
+                return call(app, counting)
+            finally:
+                frame.spans.append(
+                    ("redrawAll", start, time.perf_counter() - start))
+                frame.canvasItems += counting.items
+                self._updateCache(frame)
+        return __inner
+
+    def instrument(self, obj: Any, attr: str, phase: str | None = None) -> None:
+        '''
+        Time every call of `obj.<attr>` (e.g. a method of one object) as
+        phase `phase` (default: `attr`) while enabled; the attribute is only
+        replaced while enabled.
+        '''
+        entry = (obj, attr, phase or attr)
+        self._instruments.append(entry)
+        if self.enabled:
+            self._install(*entry)
+
+    def _install(self, obj: Any, attr: str, phase: str) -> None:
+        original = getattr(obj, attr)
+        own = attr in getattr(obj, '__dict__', {})
+        stored = obj.__dict__[attr] if own else None
+        @wraps(original)
+        def timed(*a, **kw):
+            with self.phase(phase):
+                return original(*a, **kw)
+        setattr(obj, attr, timed)
+        self._installed.append((obj, attr, own, stored))
+
+    def _phaseNames(self) -> list[str]:
+        names: dict[str, None] = {}
+        for frame in self.frames:
+            for name, _, _ in frame.spans:
+                names[name] = None
+        return list(names)
+
+    def toCSV(self, path: Path | str) -> None:
+        # one row per frame, with the seconds spent per phase
+        phases = self._phaseNames()
+        fields = [
+            'frame', 'start', 'queueDepth', 'eventsDispatched', 'canvasItems',
+            'textureHits', 'textureMisses']
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(fields + phases)
+            for frame in self.frames:
+                times = frame.phaseTimes()
+                w.writerow(
+                    [getattr(frame, k) for k in fields]
+                    + [times.get(p, 0.0) for p in phases])
+
+    def chromeTraceEvents(self) -> list[dict[str, Any]]:
+        # frames and phases as complete ("X") events, and the counters as
+        # counter ("C") events, with times in microseconds
+        if not self.frames:
+            return []
+        t0 = self.frames[0].start
+        us = lambda t: round((t - t0) * 1E6, 3)
+        events: list[dict[str, Any]] = []
+        for frame in self.frames:
+            end = max(
+                (s + d for _, s, d in frame.spans), default=frame.start)
+            events.append({
+                'name': f"frame {frame.frame}", 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': us(frame.start), 'dur': us(end) - us(frame.start),
+                'args': {
+                    'queueDepth': frame.queueDepth,
+                    'eventsDispatched': frame.eventsDispatched,
+                    'canvasItems': frame.canvasItems,
+                    'textureHits': frame.textureHits,
+                    'textureMisses': frame.textureMisses,
+                }})
+            for name, start, dur in frame.spans:
+                events.append({
+                    'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                    'ts': us(start), 'dur': round(dur * 1E6, 3)})
+            events.append({
+                'name': 'frame', 'ph': 'C', 'pid': 0, 'tid': 0,
+                'ts': us(frame.start),
+                'args': {
+                    'queueDepth': frame.queueDepth,
+                    'canvasItems': frame.canvasItems,
+                }})
+        return events
+
+    def toChromeTrace(self, path: Path | str) -> None:
+        with open(path, 'w') as f:
+            json.dump({
+                'traceEvents': self.chromeTraceEvents(),
+                'displayTimeUnit': 'ms',
+            }, f)
@@ -0,0 +1,311 @@
+from __future__ import annotations
+import numpy as np
+from PIL import Image, ImageDraw
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from custom_types import R2
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING, Any, ClassVar, Literal, Protocol, Union, runtime_checkable,
+)
+
+if TYPE_CHECKING:
+    from PIL import ImageTk
+    from axis_aligned_box import AxisAlignedBox, AxisAlignedPlatform
+    from cmu_112_graphics.cmu_112_graphics import TopLevelApp, WrappedCanvas
+
+Color = Union[str, tuple[int, int, int], tuple[int, int, int, int]]
+FrameFormat = Literal["png", "bmp", "ppm", "npy"]
+
+
+class Renderer(Protocol):
+    '''
+    Where `Grid.render`, `ChunkedGrid.render` and `drawAASystem` draw a
+    frame: a Tk canvas (`TkRenderer`) or an in-memory image
+    (`FramebufferRenderer`).
+
+    Coordinates are window pixels, with (0, 0) at the top left. Images are
+    PIL images placed by their top-left corner; renderers that also take Tk
+    PhotoImages are `PhotoRenderer`s, so callers holding both can skip the
+    conversion.
+    '''
+
+    width: int
+    height: int
+
+    def image(self, x: int, y: int, image: Image.Image) -> None: ...
+
+    def rectangle(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color | None = None, outline: Color | None = 'black',
+            ) -> None: ...
+
+    def line(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color = 'black', width: int = 1,
+            ) -> None: ...
+
+
+@runtime_checkable
+class PhotoRenderer(Renderer, Protocol):
+    '''
+    A `Renderer` that also draws Tk PhotoImages, e.g. `TkRenderer`; callers
+    tell it apart with `isinstance(renderer, PhotoRenderer)`. `toPhoto`
+    makes the PhotoImage of a PIL image, which callers may keep and draw
+    with any renderer of the same type.
+    '''
+
+    def toPhoto(self, image: Image.Image) -> ImageTk.PhotoImage: ...
+
+    def photo(self, x: int, y: int, photo: ImageTk.PhotoImage) -> None: ...
+
+
+class TkRenderer:
+    '''
+    Draws onto the canvas passed to `redrawAll`. Make a new one every frame.
+
+    PIL images passed to `image` are converted to PhotoImages, which are
+    kept (`CONVERTED_CAPACITY` of them, least recently drawn dropped first)
+    both because Tk blanks images once collected and to reuse them in later
+    frames; images are taken not to change once drawn.
+    '''
+
+    CONVERTED_CAPACITY: ClassVar[int] = 256
+
+    width: int
+    height: int
+    canvas: WrappedCanvas
+
+    # id -> (image, its PhotoImage); shared by all Tk renderers
+    _converted: ClassVar[
+        OrderedDict[int, tuple[Image.Image, ImageTk.PhotoImage]]
+    ] = OrderedDict()
+
+    def __init__(self, app: TopLevelApp, canvas: WrappedCanvas) -> None:
+        self.width, self.height = app.width, app.height
+        self.canvas = canvas
+
+    def image(self, x: int, y: int, image: Image.Image) -> None:
+        converted = self._converted
+        hit = converted.get(id(image))
+        if hit is not None and hit[0] is image:
+            converted.move_to_end(id(image))
+            photo = hit[1]
+        else:
+            photo = self.toPhoto(image)
+            converted[id(image)] = (image, photo)
+            while len(converted) > self.CONVERTED_CAPACITY:
+                converted.popitem(last=False)
+        self.photo(x, y, photo)
+
+    def toPhoto(self, image: Image.Image) -> ImageTk.PhotoImage:
+        from PIL import ImageTk  # only when drawing with Tk
+        return ImageTk.PhotoImage(image)
+
+    def photo(self, x: int, y: int, photo: ImageTk.PhotoImage) -> None:
+        # `photo` must be kept alive by the caller
+        self.canvas.create_image(x, y, image=photo, anchor='nw')
+
+    def rectangle(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color | None = None, outline: Color | None = 'black',
+            ) -> None:
+        self.canvas.create_rectangle(
+            x0, y0, x1, y1, fill=_tkColor(fill), outline=_tkColor(outline))
+
+    def line(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color = 'black', width: int = 1,
+            ) -> None:
+        self.canvas.create_line(
+            x0, y0, x1, y1, fill=_tkColor(fill), width=width)
+
+def _tkColor(color: Color | None) -> str:
+    # Tk takes '' for no color, and '#RRGGBB' strings
+    if color is None:
+        return ''
+    if isinstance(color, str):
+        return color
+    r, g, b = color[:3]
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+class FramebufferRenderer:
+    '''
+    Draws into an RGBA PIL image, `frame`, without Tk or a display; textures
+    are blitted straight into it, clipped to the frame, and alpha-composited
+    like on a Tk canvas. `array()` gives the pixels as a (height, width, 4)
+    uint8 array.
+
+    Images are taken not to change once drawn (as with the texture cache and
+    `Grid`'s chunk images), so that how to blit each one is worked out once:
+    opaque ones are copied, ones with only fully (in)visible pixels are
+    copied through a mask, and only the rest are blended.
+
+    Usage example:
+
+        fb = FramebufferRenderer(800, 600, background='#94CFE5')
+        grid.render(fb, 48, (384, 384), mode='chunks')
+        fb.save('frame.png')
+    '''
+
+    width: int
+    height: int
+    background: Color
+    frame: Image.Image
+
+    _draw: ImageDraw.ImageDraw
+    # id -> (image, None if opaque, else its '1' mask, or False to blend)
+    _blits: dict[int, tuple[Image.Image, Image.Image | bool | None]]
+
+    def __init__(
+            self, width: int, height: int, background: Color = (0, 0, 0, 0),
+            ) -> None:
+        self.width, self.height = width, height
+        self.background = background
+        self.frame = Image.new('RGBA', (width, height), background)
+        self._draw = ImageDraw.Draw(self.frame)
+        self._blits = {}
+
+    def clear(self, fill: Color | None = None) -> None:
+        # fills the frame with `fill`, by default `background`
+        fill = self.background if fill is None else fill
+        self.frame.paste(fill, (0, 0, self.width, self.height))
+
+    def image(self, x: int, y: int, image: Image.Image) -> None:
+        if (x >= self.width or y >= self.height
+                or x + image.width <= 0 or y + image.height <= 0):
+            return
+        mask = self._mask(image)
+        if mask is None:
+            self.frame.paste(image, (x, y))
+        elif mask is not False:
+            self.frame.paste(image, (x, y), mask)
+        else:
+            # `alpha_composite` takes no negative offsets, so the part off the
+            # top and left is cut off through the source offset instead
+            self.frame.alpha_composite(
+                image, (max(x, 0), max(y, 0)), (max(-x, 0), max(-y, 0)))
+
+    def _mask(self, image: Image.Image) -> Image.Image | bool | None:
+        # the image is kept along, so that its id is not reused
+        hit = self._blits.get(id(image))
+        if hit is not None and hit[0] is image:
+            return hit[1]
+        mask: Image.Image | bool | None = None
+        if image.mode == 'RGBA':
+            alpha = image.getchannel('A')
+            counts = alpha.histogram()
+            if counts[255] == image.width * image.height:
+                mask = None
+            elif counts[0] + counts[255] == image.width * image.height:
+                mask = alpha.convert('1')
+            else:
+                mask = False
+        if len(self._blits) >= 4096:
+            self._blits.clear()
+        self._blits[id(image)] = (image, mask)
+        return mask
+
+    def rectangle(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color | None = None, outline: Color | None = 'black',
+            ) -> None:
+        self._draw.rectangle(
+            (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)),
+            fill=fill, outline=outline)
+
+    def line(
+            self, x0: float, y0: float, x1: float, y1: float,
+            fill: Color = 'black', width: int = 1,
+            ) -> None:
+        self._draw.line((x0, y0, x1, y1), fill=fill, width=width)
+
+    def array(self) -> np.ndarray:
+        # a copy of the pixels, (height, width, 4) uint8
+        return np.asarray(self.frame).copy()
+
+    def save(self, path: Path | str, **params: Any) -> None:
+        self.frame.save(path, **params)
+
+
+def exportFrames(
+        render: Callable[[FramebufferRenderer, int], Any],
+        count: int,
+        outDir: Path | str,
+        size: tuple[int, int],
+        background: Color = (0, 0, 0, 255),
+        format: FrameFormat = 'png',
+        ) -> list[Path]:
+    '''
+    Render `count` frames of `size` and write them to `outDir`. Frame i is
+    drawn by `render(fb, i)` into a cleared framebuffer.
+
+    Image formats write one file per frame (frame00000.png, ...), PNGs with
+    fast, light compression; 'npy' writes all frames to one (count, height,
+    width, 4) uint8 array file, frames.npy, which `np.load(path,
+    mmap_mode='r')` reads back without loading it whole. Returns the paths
+    written.
+    '''
+    outDir = Path(outDir)
+    outDir.mkdir(parents=True, exist_ok=True)
+    width, height = size
+    fb = FramebufferRenderer(width, height, background)
+
+    if format == 'npy':
+        path = outDir / 'frames.npy'
+        frames = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.uint8, shape=(count, height, width, 4))
+        for i in range(count):
+            fb.clear()
+            render(fb, i)
+            frames[i] = np.asarray(fb.frame)
+        frames.flush()
+        del frames
+        return [path]
+
+    params: dict[str, Any] = {'compress_level': 1} if format == 'png' else {}
+    paths: list[Path] = []
+    for i in range(count):
+        fb.clear()
+        render(fb, i)
+        path = outDir / f"frame{i:05d}.{format}"
+        # BMP and PPM have no alpha
+        img = fb.frame if format == 'png' else fb.frame.convert('RGB')
+        img.save(path, **params)
+        paths.append(path)
+    return paths
+
+
+def drawAASystem(
+        renderer: Renderer,
+        boxes: Iterable[AxisAlignedBox],
+        positions: Iterable[R2],
+        platforms: Iterable[AxisAlignedPlatform],
+        displayScale: float,
+        boxColor: Color = '#FF0000',
+        platformColor: Color = 'black',
+        ) -> None:
+    # boxes (outlined, at `positions`, e.g. `Simulator.interpolatedPositions`)
+    # and platforms (as lines) of an `AASystem`, `displayScale` px per unit,
+    # with the world origin at the center of the window and y pointing up
+    W, H = renderer.width, renderer.height
+    DS = displayScale
+
+    for b, (rx, ry) in zip(boxes, positions):
+        sx, sy = b.size
+        rx_, ry_ = rx*DS + W/2, H/2 - ry*DS
+        sx_, sy_ = sx*DS, sy*DS
+        renderer.rectangle(
+            round(rx_ - sx_/2), round(ry_ - sy_/2),
+            round(rx_ + sx_/2), round(ry_ + sy_/2),
+            outline=boxColor)
+
+    for p in platforms:
+        rx, ry = p.position
+        w = p.width
+        rx_, ry_ = rx*DS + W/2, H/2 - ry*DS
+        w_ = w*DS
+        renderer.line(
+            round(rx_ - w_/2), round(ry_),
+            round(rx_ + w_/2), round(ry_), fill=platformColor)
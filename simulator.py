@@ -0,0 +1,94 @@
+from __future__ import annotations
+import dataclasses
+from axis_aligned_box import AASystem, AASystemSoA, interpolateR2
+from custom_types import R2
+
+
+@dataclasses.dataclass
+class Simulator:
+    '''
+    Run an `AASystem` (or `AASystemSoA`) at a fixed internal rate, no matter
+    how long the frames are.
+
+    Each call to `advance` adds the frame's wall-clock time to an accumulator
+    and runs as many steps of `fixedDeltaTime` as fit, but never more than
+    `maxSubsteps`; time beyond that is dropped (and counted in `droppedTime`)
+    instead of piling up, so one slow frame cannot make every following frame
+    slower (the "spiral of death").
+
+    The leftover fraction of a step is exposed as `alpha`; render with
+    `interpolatedPositions` to blend between the last two states for smooth
+    motion.
+
+    Usage example:
+
+        sim = Simulator(AASystem([], [], (0, -9.8)), fixedDeltaTime=1/120)
+
+        def timerFired(app):
+            ...
+            sim.advance(deltaTime)
+
+        def redrawAll(app, canvas):
+            for b, (rx, ry) in zip(sim.system.boxes,
+                                   sim.interpolatedPositions()):
+                ...  # draw box `b` at (rx, ry)
+    '''
+
+    system: AASystem | AASystemSoA
+    fixedDeltaTime: float = 1/120
+    maxSubsteps: int = 8
+    accumulator: float = dataclasses.field(default=0.0, init=False)
+    droppedTime: float = dataclasses.field(default=0.0, init=False)
+    steps: int = dataclasses.field(default=0, init=False)
+    _prevPositions: list[R2] = dataclasses.field(
+        default_factory=list, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if not self.fixedDeltaTime > 0:
+            raise ValueError(
+                f"fixedDeltaTime must be positive, got {self.fixedDeltaTime!r}")
+        if self.maxSubsteps < 1:
+            raise ValueError(
+                f"maxSubsteps must be at least 1, got {self.maxSubsteps!r}")
+        self._prevPositions = self._positions()
+
+    def _positions(self) -> list[R2]:
+        if isinstance(self.system, AASystemSoA):
+            return [(x, y) for x, y in self.system.positions.tolist()]
+        return [b.position for b in self.system.boxes]
+
+    @property
+    def alpha(self) -> float:
+        # how far between the previous and the current state "now" is, in [0,1)
+        return self.accumulator / self.fixedDeltaTime
+
+    def advance(self, frameTime: float) -> int:
+        # runs the fixed steps due after `frameTime` more seconds; returns how
+        # many were run
+        dt = self.fixedDeltaTime
+        self.accumulator += max(frameTime, 0.0)
+
+        n = 0
+        while self.accumulator >= dt and n < self.maxSubsteps:
+            self._prevPositions = self._positions()
+            self.system.step(dt)
+            self.accumulator -= dt
+            n += 1
+        if self.accumulator >= dt:
+            # spiral-of-death guard: drop whole steps we have no budget for
+            dropped = self.accumulator - self.accumulator % dt
+            self.droppedTime += dropped
+            self.accumulator -= dropped
+
+        self.steps += n
+        return n
+
+    def interpolatedPositions(self) -> list[R2]:
+        # box positions blended between the last two steps by `alpha`; boxes
+        # added since the last step are shown where they are
+        x = self.alpha
+        prev = self._prevPositions
+        return [
+            interpolateR2(prev[i], p, x) if i < len(prev) else p
+            for i, p in enumerate(self._positions())
+        ]
@@ -0,0 +1,194 @@
+from __future__ import annotations
+import json
+from PIL import Image
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Final
+from util import ATLASDIR, RCSDIR, TXRDIR
+
+
+# mip levels every texture is prerendered at, on top of its own size
+MIP_SIZES: Final = tuple(2**k for k in range(8))  # 1 .. 128 px
+ATLAS_VERSION: Final = 1
+
+
+def resampleFilter(srcSidelen: int, dstSidelen: int) -> Any:
+    if dstSidelen % srcSidelen == 0:
+        # integer up-scaling
+        return Image.Resampling.NEAREST
+    elif dstSidelen < srcSidelen:
+        # down-scaling
+        return Image.Resampling.BOX
+    else:
+        return Image.Resampling.BICUBIC
+
+
+def _sourceStamp(txrName: str) -> list[int]:
+    st = (TXRDIR/txrName).stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+class TextureAtlas:
+    '''
+    All block textures packed into one image, each prerendered at every mip
+    size (see `MIP_SIZES`). Row `k` of the atlas holds mip level `k` of every
+    texture, side by side in the order of `names`.
+
+    Build it once with `python texture_atlas.py`, which writes
+    `resources/atlas/atlas.png` and `atlas.json`; `loadOrBuild` reads those
+    back with a single image read, or rebuilds in memory if they are missing
+    or older than the textures.
+
+    `scaled` then serves any size as a crop of the best mip level, resampling
+    only when the size is not itself a mip size.
+    '''
+
+    image: Image.Image
+    names: tuple[str, ...]
+    mipSizes: tuple[int, ...]
+    nativeSizes: dict[str, int]
+    sources: dict[str, list[int]]  # texture file size and mtime when built
+    _columns: dict[str, int]
+    _rows: dict[int, int]  # mip size -> y offset in `image`
+
+    def __init__(
+            self,
+            image: Image.Image,
+            names: Iterable[str],
+            mipSizes: Iterable[int],
+            nativeSizes: dict[str, int],
+            sources: dict[str, list[int]] | None = None,
+            ) -> None:
+        self.image = image
+        self.names = tuple(names)
+        self.mipSizes = tuple(sorted(mipSizes))
+        self.nativeSizes = nativeSizes
+        self.sources = {} if sources is None else sources
+        self._columns = {n: i for i, n in enumerate(self.names)}
+        self._rows = {}
+        y = 0
+        for s in self.mipSizes:
+            self._rows[s] = y
+            y += s
+
+    @classmethod
+    def build(cls, txrNames: Iterable[str]) -> TextureAtlas:
+        # reads every texture in TXRDIR once and renders all its mip levels
+        names = tuple(txrNames)
+        sources: dict[str, Image.Image] = {}
+        for n in names:
+            with Image.open(TXRDIR/n) as img:
+                w, h = img.size
+                if w != h:
+                    raise ValueError(f"texture {n!r} is not square: {w}x{h}")
+                sources[n] = img.convert('RGBA')
+        nativeSizes = {n: img.size[0] for n, img in sources.items()}
+        mipSizes = sorted({*MIP_SIZES, *nativeSizes.values()})
+
+        atlas = Image.new(
+            'RGBA', (max(1, len(names)) * mipSizes[-1], sum(mipSizes)))
+        y = 0
+        for s in mipSizes:
+            for i, n in enumerate(names):
+                src = sources[n]
+                ss = src.size[0]
+                atlas.paste(
+                    src.resize((s, s), resample=resampleFilter(ss, s)),
+                    (i*s, y))
+            y += s
+        return cls(
+            atlas, names, mipSizes, nativeSizes,
+            {n: _sourceStamp(n) for n in names})
+
+    def save(self, atlasDir: Path = ATLASDIR) -> None:
+        atlasDir.mkdir(parents=True, exist_ok=True)
+        self.image.save(atlasDir/'atlas.png')
+        layout = {
+            'atlas_version': ATLAS_VERSION,
+            'names': self.names,
+            'mip_sizes': self.mipSizes,
+            'native_sizes': self.nativeSizes,
+            'sources': self.sources,
+        }
+        with (atlasDir/'atlas.json').open('w') as f:
+            json.dump(layout, f, indent=2)
+
+    @classmethod
+    def load(cls, atlasDir: Path = ATLASDIR) -> TextureAtlas:
+        with (atlasDir/'atlas.json').open() as f:
+            layout = json.load(f)
+        ver = layout['atlas_version']
+        if ver != ATLAS_VERSION:
+            raise ValueError(f"atlas_version {ver!r} is not recognized")
+        with Image.open(atlasDir/'atlas.png') as img:
+            image = img.convert('RGBA')
+        return cls(
+            image, layout['names'], layout['mip_sizes'],
+            layout['native_sizes'], layout['sources'])
+
+    @classmethod
+    def loadOrBuild(
+            cls, txrNames: Iterable[str], atlasDir: Path = ATLASDIR,
+            ) -> TextureAtlas:
+        # the prebuilt atlas if it covers `txrNames` and is up to date,
+        # otherwise a fresh one built in memory
+        names = tuple(txrNames)
+        try:
+            atlas = cls.load(atlasDir)
+            if all(atlas.sources.get(n) == _sourceStamp(n) for n in names):
+                return atlas
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(names)
+
+    def mip(self, txrName: str, mipSize: int) -> Image.Image:
+        # texture `txrName` at mip size `mipSize`, cropped out of the atlas
+        x = self._columns[txrName] * mipSize
+        y = self._rows[mipSize]
+        return self.image.crop((x, y, x + mipSize, y + mipSize))
+
+    def native(self, txrName: str) -> Image.Image:
+        return self.mip(txrName, self.nativeSizes[txrName])
+
+    def sourceMipSize(self, txrName: str, sidelen: int) -> int:
+        # the mip level to scale texture `txrName` to `sidelen` from: `sidelen`
+        # itself if it is a mip size, else one at least as big as the texture
+        # that divides `sidelen` (crisp integer up-scaling), else the nearest
+        # one above `sidelen` (down-scaling), else the largest
+        sizes = self.mipSizes
+        if sidelen in self._rows:
+            return sidelen
+        native = self.nativeSizes[txrName]
+        divisors = [s for s in sizes if s >= native and sidelen % s == 0]
+        if divisors:
+            return divisors[-1]
+        above = [s for s in sizes if s > sidelen]
+        return above[0] if above else sizes[-1]
+
+    def scaled(self, txrName: str, sidelen: int) -> Image.Image:
+        s = self.sourceMipSize(txrName, sidelen)
+        img = self.mip(txrName, s)
+        if s == sidelen:
+            return img
+        return img.resize(
+            (sidelen, sidelen), resample=resampleFilter(s, sidelen))
+
+
+def blockTextureNames(blockTypes: dict[str, Any]) -> list[str]:
+    # texture file names used in a parsed block_types.json, sorted
+    return sorted({
+        v['texture'] for v in blockTypes.values()
+        if v.get('texture') is not None })
+
+
+def main() -> None:
+    with (RCSDIR/'block_types.json').open() as f:
+        names = blockTextureNames(json.load(f))
+    atlas = TextureAtlas.build(names)
+    atlas.save()
+    w, h = atlas.image.size
+    print(f"wrote {len(names)} textures x {len(atlas.mipSizes)} mip levels "
+          f"({w}x{h} px) to {ATLASDIR}")
+
+if __name__ == '__main__':
+    main()
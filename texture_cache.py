@@ -0,0 +1,91 @@
+from __future__ import annotations
+import math
+from PIL import Image
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+_T = TypeVar('_T')
+
+
+def imageBytes(image: Any) -> int:
+    # approximate memory held by a PIL image or a Tk PhotoImage
+    if image is None:
+        return 0
+    if isinstance(image, Image.Image):
+        w, h = image.size
+        return w * h * len(image.getbands())
+    return image.width() * image.height() * 4  # Tk keeps 32-bit pixels
+
+
+class TextureCache:
+    '''
+    Least-recently-used cache of scaled textures (PIL images, Tk PhotoImages,
+    or anything `imageBytes` can size) under a byte budget, with hit, miss and
+    eviction counters.
+
+    With `stepsPerOctave` set, `quantize` snaps sizes to that many buckets per
+    doubling, so that smooth zooming reuses a handful of sizes instead of
+    creating one texture per pixel size ever visited.
+
+    Tk PhotoImages go blank once collected, so the budget should hold at least
+    one frame's worth of textures.
+    '''
+
+    budget: int
+    stepsPerOctave: int | None
+    hits: int
+    misses: int
+    evictions: int
+
+    _entries: OrderedDict[Hashable, tuple[Any, int]]
+    _bytes: int
+
+    def __init__(
+            self, budget: int = 32 << 20, stepsPerOctave: int | None = None,
+            ) -> None:
+        self.budget = budget
+        self.stepsPerOctave = stepsPerOctave
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def residentBytes(self) -> int:
+        return self._bytes
+
+    def quantize(self, sidelen: int) -> int:
+        # nearest mip bucket size to `sidelen` (unchanged if not quantizing)
+        s = self.stepsPerOctave
+        if s is None or sidelen <= 1:
+            return sidelen
+        return max(1, round(2 ** (round(math.log2(sidelen) * s) / s)))
+
+    def get(self, key: Hashable, make: Callable[[], _T]) -> _T:
+        # the value cached under `key`, made with `make()` on a miss
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = make()
+        size = imageBytes(value)
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.budget and len(self._entries) > 1:
+            _, (_, evictedSize) = self._entries.popitem(last=False)
+            self._bytes -= evictedSize
+            self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def resetStats(self) -> None:
+        self.hits = self.misses = self.evictions = 0
@@ -7,3 +7,4 @@ PROJDIR: Final = Path(__file__).resolve().parent
 RCSDIR: Final = PROJDIR/'resources'
 TXRDIR: Final = RCSDIR/'textures'
 MAPDIR: Final = RCSDIR/'maps'
+ATLASDIR: Final = RCSDIR/'atlas'  # built by texture_atlas.py